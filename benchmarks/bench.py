@@ -0,0 +1,216 @@
+"""
+Benchmarks of the logic hot paths.
+
+Every benchmark uses fixed seeds and realistic card distributions (cards dealt from a
+shuffled deck, bets from random play), and reports operations per second. A repetition
+loops a benchmark for at least MIN_SECONDS, and the median of REPEAT repetitions is
+reported, so short benchmarks are not at the mercy of the scheduler. Results are
+written as JSON and compared against a stored baseline: a benchmark more than threshold
+slower than its baseline is a regression, and the run exits with status 1.
+
+Baselines depend on the machine, regenerate them with --update-baseline where the
+comparison runs.
+
+    python benchmarks/bench.py [--output results.json] [--baseline benchmarks/baseline.json]
+                               [--threshold 0.25] [--update-baseline] [benchmark ...]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from minipoker.logic.deck import Deck
+from minipoker.logic.hands import Hand
+from minipoker.logic.players import RandomPlayer
+from minipoker.logic.poker import Poker, Pot, Round
+from minipoker.logic.ai import cache, utils
+from minipoker.logic.ai.aiplayers import SimpleAIPlayer
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+THRESHOLD = 0.25
+# the median of this many repetitions is reported
+REPEAT = 7
+# each repetition runs a benchmark this long at least
+MIN_SECONDS = 0.5
+SEED = 1234
+
+
+def deal(rng, count):
+    deck = Deck(rng)
+    return deck.draw(count)
+
+
+def bench_get_hand():
+    rng = random.Random(SEED)
+    hands = [deal(rng, 5) for _ in range(20000)]
+
+    def run():
+        for cards in hands:
+            Hand.get_hand(cards)
+    return run, len(hands)
+
+
+def bench_best_hand():
+    rng = random.Random(SEED)
+    players = []
+    for _ in range(5000):
+        cards = deal(rng, 7)
+        player = RandomPlayer("bench", 0)
+        player.set_pocket(*cards[:2])
+        players.append((player, cards[2:]))
+
+    def run():
+        for player, board in players:
+            player.best_hand(board)
+    return run, len(players)
+
+
+def bench_naive_rank():
+    rng = random.Random(SEED)
+    situations = []
+    for community in (0, 3, 4):
+        for _ in range(5):
+            cards = deal(rng, 2 + community)
+            situations.append((tuple(cards[:2]), tuple(cards[2:])))
+
+    def run():
+        for pocket, community_cards in situations:
+            utils.naive_rank(pocket, community_cards)
+    return run, len(situations)
+
+
+def bench_pot_payouts():
+    rng = random.Random(SEED)
+    pots = []
+    for _ in range(2000):
+        seats = rng.randint(2, 10)
+        # short stacks all in for little, the rest betting more, a few folded
+        bets = [rng.choice([rng.randint(1, 20), rng.randint(20, 200)]) for _ in range(seats)]
+        strengths = {seat: rng.randint(0, 100) for seat in range(seats) if rng.random() < 0.8} or {0: 0}
+        pots.append((bets, strengths))
+
+    def run():
+        for bets, strengths in pots:
+            pot = Pot(1)
+            for seat, amount in enumerate(bets):
+                pot.bet(seat, amount)
+            pot.payouts(strengths)
+    return run, len(pots)
+
+
+def bench_round_play():
+    rounds = 300
+
+    def run():
+        rng = random.Random(SEED)
+        players = [RandomPlayer("bench-%d" % seat, 10 ** 6, rng) for seat in range(6)]
+        game = Poker(list(players), headless=True, history=1, game_log=False, rng=rng)
+        for number in range(rounds):
+            game.current_round = Round(players, players[number % len(players)], 1, game.event_queue, game)
+            game.current_round.play()
+    return run, rounds
+
+
+def bench_simple_ai_interact():
+    rng = random.Random(SEED)
+    games = []
+    for _ in range(10):
+        players = [SimpleAIPlayer("bench-%d" % seat, 1000, rng) for seat in range(6)]
+        game = Poker(list(players), headless=True, history=1, game_log=False, rng=rng)
+        round_ = Round(players, players[0], 1, game.event_queue, game)
+        round_.take_blinds()
+        round_.open_flop_cards()
+        round_.betting_player = round_.after(round_.big_blind_player())
+        game.current_round = round_
+        games.append(game)
+
+    def run():
+        cache.configure()
+        for game in games:
+            game.current_round.betting_player.interact(game)
+    return run, len(games)
+
+
+BENCHMARKS = {
+    'hand_get_hand': bench_get_hand,
+    'player_best_hand': bench_best_hand,
+    'naive_rank': bench_naive_rank,
+    'pot_payouts': bench_pot_payouts,
+    'round_play': bench_round_play,
+    'simple_ai_interact': bench_simple_ai_interact,
+}
+
+
+def timed(run, loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        run()
+    return time.perf_counter() - start
+
+
+def measure(benchmark):
+    run, operations = benchmark()
+    # warm up, then size the repetitions
+    timed(run, 1)
+    loops = max(1, int(MIN_SECONDS / timed(run, 1)) + 1)
+    seconds = statistics.median(timed(run, loops) for _ in range(REPEAT))
+    return {
+        'operations': operations * loops,
+        'seconds': seconds,
+        'ops_per_second': operations * loops / seconds,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    :return: list of (name, result ops/s, baseline ops/s) for regressions
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name in baseline and result['ops_per_second'] < baseline[name]['ops_per_second'] * (1 - threshold):
+            regressions.append((name, result['ops_per_second'], baseline[name]['ops_per_second']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the logic hot paths")
+    parser.add_argument('benchmarks', nargs='*', help="benchmarks to run: %s" % ', '.join(sorted(BENCHMARKS)))
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="allowed slowdown (0.25 is 25%%)")
+    parser.add_argument('--update-baseline', action='store_true', help="store the results as the new baseline")
+    arguments = parser.parse_args(argv)
+
+    results = {}
+    for name in arguments.benchmarks or sorted(BENCHMARKS):
+        results[name] = measure(BENCHMARKS[name])
+        print("%-25s %12.1f ops/s" % (name, results[name]['ops_per_second']))
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+    if arguments.update_baseline:
+        with open(arguments.baseline, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=2, sort_keys=True)
+        return 0
+    if not os.path.exists(arguments.baseline):
+        print("no baseline at %s" % arguments.baseline)
+        return 0
+    with open(arguments.baseline) as baseline_file:
+        baseline = json.load(baseline_file)['results']
+    regressions = compare(results, baseline, arguments.threshold)
+    for name, current, previous in regressions:
+        print("REGRESSION %s: %.1f ops/s, baseline %.1f ops/s (%.0f%% slower)" % (
+            name, current, previous, 100 * (1 - current / previous)))
+    return 1 if regressions else 0
+
+
+if "__main__" == __name__:
+    sys.exit(main())
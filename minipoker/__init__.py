@@ -1,2 +1 @@
-from minipoker.gui import game
-game.main()
+__author__ = 'reut'
@@ -0,0 +1,2 @@
+from minipoker.gui import game
+game.main()
@@ -3,6 +3,7 @@ import queue
 import threading
 import logging
 import os
+from itertools import islice
 
 from minipoker.logic import poker as ppoker, players
 
@@ -240,8 +241,17 @@ class GUIHumanPlayer(players.BasePlayer):
     def interact(self, _round):
         LOGGER.debug("refreshing gui before %s's action", self.name)
 
-        # get move
-        return self.queue.get()
+        # drop moves made too late for an earlier turn
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        # get move (_round is the game), giving up once the action's time runs out
+        try:
+            return self.queue.get(timeout=self.time_left(_round.current_round))
+        except queue.Empty:
+            return None
 
     def get_amount(self, _min, _max):
         self.queue.get()
@@ -273,6 +283,61 @@ class GUIHumanPlayer(players.BasePlayer):
             return amount
 
 
+class RenderScheduler(object):
+    """
+    Stands in for the game's event queue. The game thread only queues events, it never calls
+    into Tk: a poll running on the Tk thread (Tk's after) drains the queue and redraws once for
+    all the events it found. Polls are 1 / max_fps apart while events come in, and back off to
+    idle_interval while the table is idle (e.g. waiting on a human player).
+    """
+
+    def __init__(self, widget, render, max_fps=30, idle_interval=0.25):
+        self.widget = widget
+        self.render = render
+        self.min_interval = 1.0 / max_fps
+        self.idle_interval = idle_interval
+        self.interval = self.min_interval
+        self.events = queue.Queue()
+        self.running = False
+
+    def put(self, event):
+        # called from the game thread
+        self.events.put(event)
+
+    def start(self):
+        """
+        start polling (on the Tk thread)
+        """
+        if not self.running:
+            self.running = True
+            self.widget.after(0, self.poll)
+
+    def stop(self):
+        self.running = False
+
+    def poll(self):
+        if not self.running:
+            return
+        events = 0
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                break
+            events += 1
+        if events:
+            LOGGER.debug("Rendering %d events", events)
+            self.render()
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.idle_interval)
+        try:
+            self.widget.after(int(self.interval * 1000), self.poll)
+        except tk.TclError:
+            # the window is gone
+            self.running = False
+
+
 class Game(object):
     def __init__(self, frame, logic):
 
@@ -304,42 +369,31 @@ class Game(object):
         self.game_log = tk.Text(self.frame, height=10)
         self.game_log.grid(row=len(self.game_logic.players) + 4, columnspan=9)
 
+        # events from the game thread are drained and rendered by a poll on the Tk thread
+        self.game_logic.event_queue = RenderScheduler(self.frame, self.render)
+        self.game_logic.event_queue.start()
+
         # start game only after gui initialized
         self.game_thread = threading.Thread(target=self.game_logic.play)
         self.game_thread.start()
-        self.frame.after(10, func=self.process_event_queue)
         self.frame.pack()
 
     @staticmethod
     def get_amount(_min, _max):
         print("get amount %d - %d" % (_min, _max))
 
-    def process_event_queue(self):
-        # this is needed to let UI thread update widgets
-        # (tkinter does not support multi threading)
-        try:
-            # LOGGER.debug("processing events") # too much output
-            message = self.game_logic.event_queue.get(block=False)
-
-            if message:
-                LOGGER.debug("Got event: %s" % str(message))
-                _round = self.game_logic.current_round
-                for player_frame in self.player_frames.values():
-                    player = player_frame.player
-                    if _round:
-                        LOGGER.debug("Populating: %s" % player.name)
-                        player_frame.refresh(_round)
-                    LOGGER.debug("refreshing community cards %s" % str(_round.community_cards))
-                    for label, card in zip(self.community_cards, _round.community_cards + [''] * 5):
-                        label['text'] = card
-                        if card:
-                            LOGGER.debug("setting color to: %s" % card.color())
-                            label['fg'] = card.color()
-                self.refresh_logs()
-            self.frame.pack()
-        except queue.Empty:
-            pass
-        self.frame.after(10, func=self.process_event_queue)
+    def render(self):
+        _round = self.game_logic.current_round
+        if _round is None:
+            return
+        for player_frame in self.player_frames.values():
+            player_frame.refresh(_round)
+        LOGGER.debug("refreshing community cards %s", _round.community_cards)
+        for label, card in zip(self.community_cards, _round.community_cards + [''] * 5):
+            label['text'] = card
+            if card:
+                label['fg'] = card.color()
+        self.refresh_logs()
 
     def refresh_logs(self):
         self.round_log.delete(1.0, tk.END)
@@ -347,7 +401,7 @@ class Game(object):
             str(action) for action in reversed(self.game_logic.current_round.action_log[-10:])))
         self.game_log.delete(1.0, tk.END)
         self.game_log.insert(tk.END, os.linesep.join(
-            str(action) for action in reversed(self.game_logic.log[-10:])))
+            str(action) for action in islice(reversed(self.game_logic.log), 10)))
 
 
 PLAYER_TYPES = {c.NAME: c for c in [GUIHumanPlayer, players.RandomPlayer]}
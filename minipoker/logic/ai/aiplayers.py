@@ -1,15 +1,14 @@
 from minipoker.logic.players import BasePlayer
 from minipoker.logic.ai import strategies
-import random
 
 
 class SimpleAIPlayer(BasePlayer):
 
     NAME = "Simple AI"
 
-    def __init__(self, name, starting_money):
-        super(SimpleAIPlayer, self).__init__(name, starting_money)
-        self.strat = strategies.SimpleSaneStrategy(1, 1, 1, 1)
+    def __init__(self, name, starting_money, rng=None):
+        super(SimpleAIPlayer, self).__init__(name, starting_money, rng)
+        self.strat = strategies.SimpleSaneStrategy(1, 1, 1, 1, max_samples=2000, target_error=0.05)
 
     def interact(self, _game):
         round_ = _game.current_round
@@ -19,4 +18,4 @@ class SimpleAIPlayer(BasePlayer):
         return action(self, round_)
 
     def get_amount(self, _min, _max):
-        return random.randint(_min, _max)
+        return self.rng.randint(_min, _max)
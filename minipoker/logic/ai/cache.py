@@ -0,0 +1,173 @@
+"""
+Caching of hand values.
+
+Hand values are pure functions of the cards, and of the cards only up to suit renaming,
+so they are cached under the canonical form of the situation (see isomorphism). The cache
+has two tiers: a bounded in memory map, and an optional SQLite file that survives restarts
+and can be shared by several processes.
+"""
+from collections import OrderedDict
+import json
+import sqlite3
+import threading
+
+from minipoker.logic.ai import isomorphism
+
+LRU = 'lru'
+FIFO = 'fifo'
+
+
+class CacheStats(object):
+    def __init__(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def lookups(self):
+        return self.hits + self.disk_hits + self.misses
+
+    @property
+    def hit_rate(self):
+        return (self.hits + self.disk_hits) / self.lookups if self.lookups else 0.0
+
+    def as_dict(self):
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate,
+        }
+
+    def __str__(self):
+        return "hits: %d, disk hits: %d, misses: %d, evictions: %d (hit rate %.2f)" % (
+            self.hits, self.disk_hits, self.misses, self.evictions, self.hit_rate)
+
+
+class DiskStore(object):
+    """
+    persistent key -> value store in a SQLite file, values are stored as JSON
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        # let simulation workers read while one of them writes
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS hand_values (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def get(self, key):
+        row = self.connection.execute("SELECT value FROM hand_values WHERE key = ?", (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO hand_values (key, value) VALUES (?, ?)",
+                                (key, json.dumps(value)))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM hand_values").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+
+class HandValueCache(object):
+    """
+    two tier cache: a bounded in memory map in front of an optional DiskStore. Lookups may come
+    from several threads (e.g. the bots of the server's tables), values are computed unlocked.
+    """
+
+    def __init__(self, maxsize=100000, policy=LRU, path=None):
+        """
+        :param maxsize: number of entries kept in memory
+        :param policy: eviction policy of the memory tier, LRU (hits refresh an entry) or
+                       FIFO (entries leave in insertion order, hits cost less)
+        :param path: SQLite file of the persistent tier (None for memory only)
+        """
+        if policy not in (LRU, FIFO):
+            raise ValueError("Unknown eviction policy: %s" % policy)
+        self.maxsize = maxsize
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.store = None if path is None else DiskStore(path)
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute, keep=None):
+        """
+        :param key: string key
+        :param compute: function computing the value on a miss
+        :param keep: function called after compute, telling whether the computed value may be
+                     reused (None keeps every value)
+        :return: cached or computed value
+        """
+        with self._lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                pass
+            else:
+                self.stats.hits += 1
+                if self.policy == LRU:
+                    self.entries.move_to_end(key)
+                return value
+            value = None if self.store is None else self.store.get(key)
+            if value is None:
+                self.stats.misses += 1
+            else:
+                self.stats.disk_hits += 1
+        if value is None:
+            value = compute()
+            if keep is not None and not keep():
+                return value
+            if self.store is not None:
+                with self._lock:
+                    self.store.put(key, value)
+        with self._lock:
+            self.entries[key] = value
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.stats.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+
+def situation_key(name, pocket, community_cards, *parameters):
+    """
+    :return: cache key of a hand value function applied to a situation
+    """
+    return "%s%r%r" % (name, isomorphism.canonical_key(pocket, community_cards), parameters)
+
+
+_default = None
+
+
+def default_cache():
+    """
+    :return: the cache shared by strategies that were not given one (memory only unless configured)
+    """
+    global _default
+    if _default is None:
+        _default = HandValueCache()
+    return _default
+
+
+def configure(maxsize=100000, policy=LRU, path=None):
+    """
+    replace the shared cache, e.g. to back it with a file. Each process should configure its own
+    cache (SQLite connections can not be shared across a fork), pointing them at the same path.
+    """
+    global _default
+    if _default is not None:
+        _default.close()
+    _default = HandValueCache(maxsize, policy, path)
+    return _default
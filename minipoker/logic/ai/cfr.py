@@ -0,0 +1,410 @@
+"""
+Counterfactual regret minimization for heads-up games (requires numpy).
+
+The solver trains on an abstraction of a heads-up Round, with the same rules:
+
+    blinds      the player after the button posts the small blind, the button the big blind,
+                and the player after the button acts first on every street
+    actions     Fold (only when there is something to call), Check, Call, and two bet sizes:
+                the minimum (Pot.minimum_to_bet) and the pot (capped at the player's money),
+                with at most raise_cap bets per street
+    streets     preflop, flop, turn and river; once a player is all in the board runs out
+
+Both players start with the same stack. Cards are abstracted into buckets: the 169 starting
+hand classes before the flop (see preflop.hand_class), then the category of the best hand
+and whether it has a flush or an open ended straight draw.
+
+Every action node of the betting tree (GameTree) owns one row per bucket of its street,
+so an infoset is a row index: regrets and strategy sums are (infosets, ACTIONS) arrays.
+Iterations use external sampling (Monte Carlo CFR): a deal is sampled, the traverser's
+actions are all explored and the opponent's sampled from the current strategy. With
+plus (the default) regrets are floored at zero and the average strategy weighs each
+iteration by its number, as in CFR+.
+
+Iterations run in batches, and several batches (jobs) run against the same regrets
+before their updates are merged, in worker processes or inline. Each batch has its own
+random generator, derived from the seed and its first iteration, so the result only
+depends on the iterations, the batch size, the jobs and the seed, not on the processes.
+The tables are saved to (and resumed from) a .npz checkpoint.
+
+Run python -m minipoker.logic.ai.cfr --help for the command line.
+"""
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+from minipoker.logic import evaluator, trace
+from minipoker.logic.ai import preflop
+from minipoker.logic.ai.strategies import CFRDistribution
+from minipoker.logic.deck import CARDS
+
+TRACE = trace.tracer("ai-cfr")
+
+# abstract actions (columns of the tables)
+FOLD, CHECK, CALL, BET_MIN, BET_POT = range(5)
+ACTIONS = 5
+ACTION_NAMES = ('Fold', 'Check', 'Call', 'Bet', 'Bet')
+
+# streets
+PREFLOP, FLOP, TURN, RIVER = range(4)
+BOARD_CARDS = (0, 3, 4, 5)
+
+# buckets per street
+POSTFLOP_BUCKETS = 2 * (evaluator.STRAIGHT_FLUSH + 1)
+BUCKETS = (preflop.CLASSES, POSTFLOP_BUCKETS, POSTFLOP_BUCKETS, POSTFLOP_BUCKETS)
+
+# node kinds
+ACT, FOLDED, SHOWDOWN = range(3)
+
+CHECKPOINT_VERSION = 1
+
+
+class InvalidCheckpointException(Exception):
+    pass
+
+
+def postflop_bucket(state):
+    """
+    :param state: evaluator.HandState of a pocket and at least three community cards
+    :return: bucket of the hand: its category, and whether it has a draw
+    """
+    outs = state.straight_outs
+    draw = len(state.cards) < 7 and (state.flush_draw or bool(outs & (outs - 1)))
+    return 2 * state.category + draw
+
+
+def deal(rng):
+    """
+    :return: (buckets of each player by street, showdown result: 1 if the first player wins,
+             -1 if the second does, 0 on a split)
+    """
+    cards = rng.sample(CARDS, 9)
+    board = cards[4:]
+    buckets = []
+    strengths = []
+    for pocket in (cards[0:2], cards[2:4]):
+        state = evaluator.HandState(pocket + board[:3])
+        player_buckets = [preflop.hand_class(*pocket), postflop_bucket(state)]
+        for card in board[3:]:
+            state.add(card)
+            player_buckets.append(postflop_bucket(state))
+        buckets.append(player_buckets)
+        strengths.append(state.strength)
+    return buckets, (strengths[0] > strengths[1]) - (strengths[0] < strengths[1])
+
+
+class GameTree(object):
+    """
+    the abstract betting tree, nodes are numbered from the root (0) and their attributes are
+    kept in lists indexed by node
+    """
+
+    def __init__(self, stack, small_blind=1, raise_cap=2):
+        """
+        :param stack: starting money of both players
+        :param raise_cap: bets (and raises) allowed per street
+        """
+        if stack <= 2 * small_blind:
+            raise ValueError("stack has to be above the big blind")
+        self.stack = stack
+        self.small_blind = small_blind
+        self.raise_cap = raise_cap
+        self.kind = []
+        # player to act (the folding player of a FOLDED node)
+        self.player = []
+        self.street = []
+        self.contributions = []
+        # legal actions, the chips each puts in and the node it leads to
+        self.actions = []
+        self.amounts = []
+        self.children = []
+        # first infoset row of an action node (one row per bucket of its street)
+        self.offsets = []
+        self.infosets = 0
+        # blinds, as Round.take_blinds: player 0 is after the button, player 1 the button
+        self.root = self._node(PREFLOP, 0, (small_blind, 2 * small_blind), acted=0, owing=1, raises=0)
+
+    def __len__(self):
+        return len(self.kind)
+
+    def _add(self, kind, player, street, contributions):
+        node = len(self.kind)
+        self.kind.append(kind)
+        self.player.append(player)
+        self.street.append(street)
+        self.contributions.append(contributions)
+        self.actions.append(())
+        self.amounts.append(())
+        self.children.append(())
+        self.offsets.append(-1)
+        return node
+
+    def _node(self, street, player, contributions, acted, owing, raises):
+        node = self._add(ACT, player, street, contributions)
+        self.offsets[node] = self.infosets
+        self.infosets += BUCKETS[street]
+        current = max(contributions)
+        money = self.stack - contributions[player]
+        to_call = current - contributions[player]
+        choices = [(CHECK, 0)] if to_call == 0 else [(FOLD, 0)] + ([(CALL, to_call)] if money >= to_call else [])
+        # as Pot.minimum_to_bet (the last raise stays the big blind)
+        minimum = max(1, to_call + 2 * self.small_blind)
+        if raises < self.raise_cap and money >= minimum:
+            choices.append((BET_MIN, minimum))
+            pot = min(money, 2 * to_call + sum(contributions))
+            if pot > minimum:
+                choices.append((BET_POT, pot))
+        children = []
+        for action, amount in choices:
+            if action == FOLD:
+                children.append(self._add(FOLDED, player, street, contributions))
+                continue
+            bit = 1 << player
+            bets = list(contributions)
+            bets[player] += amount
+            bets = tuple(bets)
+            # as SeatTable: raising makes the other player owe, matching clears the debt
+            if bets[player] > current:
+                after_owing, after_raises = 3 & ~bit, raises + 1
+            else:
+                after_owing, after_raises = owing & ~bit, raises
+            after_acted = acted | bit
+            all_in = sum(1 << seat for seat in range(2) if bets[seat] == self.stack)
+            pending = (after_owing | (3 & ~after_acted)) & ~all_in & ~bit
+            if pending:
+                children.append(self._node(street, 1 - player, bets, after_acted, after_owing, after_raises))
+            elif all_in or street == RIVER:
+                children.append(self._add(SHOWDOWN, player, street, bets))
+            else:
+                children.append(self._node(street + 1, 0, bets, acted=0, owing=0, raises=0))
+        self.actions[node] = tuple(action for action, _ in choices)
+        self.amounts[node] = tuple(amount for _, amount in choices)
+        self.children[node] = tuple(children)
+        return node
+
+    def payoff(self, node, player, result):
+        """
+        :param result: showdown result (see deal)
+        :return: chips the player wins (or loses) at a terminal node
+        """
+        contributions = self.contributions[node]
+        if self.kind[node] == FOLDED:
+            folder = self.player[node]
+            return -contributions[player] if folder == player else contributions[folder]
+        return contributions[player] * (result if player == 0 else -result)
+
+
+def _regret_matching(row, actions):
+    positive = [value if value > 0 else 0.0 for value in row[list(actions)].tolist()]
+    total = sum(positive)
+    if total > 0:
+        return [value / total for value in positive]
+    return [1.0 / len(actions)] * len(actions)
+
+
+class Solver(object):
+    def __init__(self, stack=20, small_blind=1, raise_cap=2, plus=True):
+        """
+        :param plus: CFR+ (regrets floored at zero, linearly weighted average strategy)
+        """
+        self.tree = _tree(stack, small_blind, raise_cap)
+        self.plus = plus
+        self.regrets = np.zeros((self.tree.infosets, ACTIONS))
+        self.strategy_sum = np.zeros((self.tree.infosets, ACTIONS))
+        self.iterations = 0
+
+    @property
+    def config(self):
+        return self.tree.stack, self.tree.small_blind, self.tree.raise_cap, self.plus
+
+    def iterate(self, rng, iteration):
+        """
+        one external sampling iteration (each player traverses once), updating the tables in place
+        :param iteration: number of the iteration (the weight of its strategies with plus)
+        """
+        weight = iteration if self.plus else 1
+        for traverser in (0, 1):
+            buckets, result = deal(rng)
+            self._traverse(self.tree.root, traverser, buckets, result, weight, rng)
+
+    def _traverse(self, node, traverser, buckets, result, weight, rng):
+        tree = self.tree
+        if tree.kind[node] != ACT:
+            return tree.payoff(node, traverser, result)
+        player = tree.player[node]
+        row = tree.offsets[node] + buckets[player][tree.street[node]]
+        actions = tree.actions[node]
+        strategy = _regret_matching(self.regrets[row], actions)
+        children = tree.children[node]
+        if player != traverser:
+            columns = list(actions)
+            self.strategy_sum[row, columns] += np.multiply(strategy, weight)
+            pick = rng.random()
+            for index, probability in enumerate(strategy):
+                pick -= probability
+                if pick <= 0:
+                    break
+            return self._traverse(children[index], traverser, buckets, result, weight, rng)
+        values = [self._traverse(child, traverser, buckets, result, weight, rng) for child in children]
+        value = sum(probability * child_value for probability, child_value in zip(strategy, values))
+        columns = list(actions)
+        regrets = self.regrets[row, columns] + np.subtract(values, value)
+        self.regrets[row, columns] = np.maximum(regrets, 0.0) if self.plus else regrets
+        return value
+
+    def train(self, iterations, processes=1, batch=100, jobs=None, seed=0, checkpoint=None, checkpoint_every=0):
+        """
+        :param iterations: iterations to run (on top of the ones already run)
+        :param processes: worker processes (1 runs the batches in this process)
+        :param batch: iterations per batch
+        :param jobs: batches run against the same regrets before they are merged (defaults to processes)
+        :param seed: seed of the batches' random generators
+        :param checkpoint: path the tables are saved to every checkpoint_every iterations, and at the end
+        """
+        jobs = jobs or processes
+        pool = None
+        if processes > 1:
+            import multiprocessing
+            pool = multiprocessing.Pool(processes)
+        try:
+            target = self.iterations + iterations
+            saved = self.iterations
+            while self.iterations < target:
+                work = []
+                first = self.iterations + 1
+                for _ in range(jobs):
+                    count = min(batch, target - first + 1)
+                    if count <= 0:
+                        break
+                    work.append((self.config, self.regrets, seed, first, count))
+                    first += count
+                start = time.perf_counter()
+                results = pool.map(_run_batch, work) if pool is not None else [_run_batch(job) for job in work]
+                for regret_delta, strategy_delta in results:
+                    self.regrets += regret_delta
+                    self.strategy_sum += strategy_delta
+                if self.plus:
+                    np.maximum(self.regrets, 0.0, out=self.regrets)
+                self.iterations = first - 1
+                TRACE.info('cfr_batches', iterations=self.iterations, jobs=len(work),
+                           seconds=time.perf_counter() - start)
+                if checkpoint and checkpoint_every and self.iterations - saved >= checkpoint_every:
+                    self.save(checkpoint)
+                    saved = self.iterations
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        if checkpoint:
+            self.save(checkpoint)
+        return self
+
+    def average_strategy(self):
+        """
+        :return: (infosets, ACTIONS) array of the average strategy, uniform over the legal actions
+                 of infosets never reached
+        """
+        legal = np.zeros((self.tree.infosets, ACTIONS))
+        tree = self.tree
+        for node, actions in enumerate(tree.actions):
+            if tree.kind[node] == ACT:
+                offset = tree.offsets[node]
+                legal[offset:offset + BUCKETS[tree.street[node]], list(actions)] = 1.0
+        totals = self.strategy_sum.sum(axis=1, keepdims=True)
+        uniform = legal / legal.sum(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(totals > 0, self.strategy_sum / totals, uniform)
+
+    def distribution(self, node, bucket):
+        """
+        :return: the average strategy of a node's infoset as a CFRDistribution (bet sizes merged)
+        """
+        tree = self.tree
+        row = self.strategy_sum[tree.offsets[node] + bucket]
+        total = row.sum()
+        probabilities = row / total if total > 0 else np.array([
+            1.0 / len(tree.actions[node]) if action in tree.actions[node] else 0.0 for action in range(ACTIONS)])
+        return CFRDistribution(probabilities[CALL], probabilities[FOLD],
+                               probabilities[BET_MIN] + probabilities[BET_POT], probabilities[CHECK])
+
+    def save(self, path):
+        """
+        write the tables to a .npz checkpoint (replacing it only once it is complete)
+        """
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as checkpoint_file:
+            np.savez(checkpoint_file, version=CHECKPOINT_VERSION, config=np.array(self.config, dtype=np.int64),
+                     iterations=self.iterations, regrets=self.regrets, strategy_sum=self.strategy_sum)
+        os.replace(temporary, path)
+        TRACE.info('cfr_checkpoint', path=path, iterations=self.iterations)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as checkpoint:
+            if 'version' not in checkpoint or int(checkpoint['version']) != CHECKPOINT_VERSION:
+                raise InvalidCheckpointException("Not a CFR checkpoint (or unsupported version): %s" % path)
+            stack, small_blind, raise_cap, plus = (int(value) for value in checkpoint['config'])
+            solver = cls(stack, small_blind, raise_cap, bool(plus))
+            if checkpoint['regrets'].shape != solver.regrets.shape:
+                raise InvalidCheckpointException("Checkpoint tables do not match its game: %s" % path)
+            solver.regrets = checkpoint['regrets'].copy()
+            solver.strategy_sum = checkpoint['strategy_sum'].copy()
+            solver.iterations = int(checkpoint['iterations'])
+        return solver
+
+
+_trees = {}
+
+
+def _tree(stack, small_blind, raise_cap):
+    """
+    :return: the GameTree of the game, built once per process
+    """
+    key = (stack, small_blind, raise_cap)
+    if key not in _trees:
+        _trees[key] = GameTree(stack, small_blind, raise_cap)
+    return _trees[key]
+
+
+def _run_batch(args):
+    """
+    :param args: (solver config, regrets, seed, first iteration, iterations)
+    :return: (regrets update, strategy sum update)
+    """
+    config, regrets, seed, first, count = args
+    solver = Solver(*config)
+    solver.regrets = regrets.copy()
+    rng = random.Random("%s-%d" % (seed, first))
+    for iteration in range(first, first + count):
+        solver.iterate(rng, iteration)
+    return solver.regrets - regrets, solver.strategy_sum
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="Train a heads-up strategy with CFR")
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--stack', type=int, default=20)
+    parser.add_argument('--raise-cap', type=int, default=2, help="bets allowed per street")
+    parser.add_argument('--vanilla', action='store_true', help="plain CFR instead of CFR+")
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--batch', type=int, default=1000, help="iterations per batch")
+    parser.add_argument('--jobs', type=int, default=None, help="batches merged at once (defaults to processes)")
+    parser.add_argument('--seed', default=0)
+    parser.add_argument('--checkpoint', metavar='PATH', help="save the tables here (and resume from it if it exists)")
+    parser.add_argument('--checkpoint-every', type=int, default=10000, metavar='ITERATIONS')
+    arguments = parser.parse_args()
+    # train through the imported module, so the pool workers can find _run_batch
+    from minipoker.logic.ai import cfr
+    if arguments.checkpoint and os.path.exists(arguments.checkpoint):
+        solver = cfr.Solver.load(arguments.checkpoint)
+    else:
+        solver = cfr.Solver(arguments.stack, raise_cap=arguments.raise_cap, plus=not arguments.vanilla)
+    start = time.perf_counter()
+    solver.train(arguments.iterations, arguments.processes, arguments.batch, arguments.jobs, arguments.seed,
+                 arguments.checkpoint, arguments.checkpoint_every)
+    print("%d iterations (%d infosets, %d nodes), %.1f iterations/s" % (
+        solver.iterations, solver.tree.infosets, len(solver.tree),
+        arguments.iterations / (time.perf_counter() - start)))
@@ -0,0 +1,134 @@
+"""
+Monte Carlo estimation of hand values.
+
+Instead of enumerating every completion of the board (see utils.naive_rank), completions
+are sampled until a sample count, a wall clock budget or a target error is reached. Results
+come back as an Estimate holding the mean, the half width of its confidence interval and
+the budget that stopped the sampling.
+"""
+from collections import namedtuple
+from math import sqrt, inf
+import random
+import time
+
+from minipoker.logic.deck import CARDS
+from minipoker.logic import evaluator
+
+# z score of the default (95%) confidence interval
+Z_95 = 1.96
+
+Estimate = namedtuple('Estimate', ['mean', 'error', 'samples', 'stopped'])
+
+# what stopped the sampling (Estimate.stopped)
+MAX_SAMPLES = 'max_samples'
+TIME_BUDGET = 'time_budget'
+TARGET_ERROR = 'target_error'
+
+# how many samples to take between wall clock checks
+_CLOCK_INTERVAL = 32
+
+
+class NoBudgetException(Exception):
+    pass
+
+
+def monte_carlo(sample, max_samples=None, time_budget=None, target_error=None, min_samples=30, z=Z_95, rng=None):
+    """
+    estimate the mean of a random variable, stopping on the first budget that runs out
+    :param sample: function taking a random generator and returning one sample
+    :param max_samples: stop after this many samples
+    :param time_budget: stop after this many seconds
+    :param target_error: stop once the confidence interval half width drops below this
+    :param min_samples: never stop on target_error before this many samples
+    :param z: z score of the confidence interval
+    :param rng: random generator to use (defaults to the random module)
+    :return: Estimate
+    """
+    if max_samples is None and time_budget is None and target_error is None:
+        raise NoBudgetException("At least one of max_samples, time_budget or target_error is required")
+    rng = rng or random
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    count, mean, m2 = 0, 0.0, 0.0
+    error = inf
+    while True:
+        value = sample(rng)
+        # Welford's online mean / variance
+        count += 1
+        delta = value - mean
+        mean += delta / count
+        m2 += delta * (value - mean)
+        if count > 1:
+            error = z * sqrt(m2 / (count - 1) / count)
+        if max_samples is not None and count >= max_samples:
+            stopped = MAX_SAMPLES
+            break
+        if target_error is not None and count >= min_samples and error <= target_error:
+            stopped = TARGET_ERROR
+            break
+        if deadline is not None and count % _CLOCK_INTERVAL == 0 and time.perf_counter() >= deadline:
+            stopped = TIME_BUDGET
+            break
+    return Estimate(mean, error, count, stopped)
+
+
+def _remaining(cards):
+    used = set(cards)
+    return [card for card in CARDS if card not in used]
+
+
+def rank_sampler(pocket, community_cards):
+    """
+    sampler of the quantity utils.naive_rank computes exactly: the category of the best
+    hand after opening up to three more cards
+    """
+    known = list(pocket) + list(community_cards)
+    unopened_slots = min(3, 7 - len(known))
+    deck = _remaining(known)
+    evaluate, category = evaluator.evaluate, evaluator.category
+
+    def sample(rng):
+        return category(evaluate(known + rng.sample(deck, unopened_slots)))
+    return sample
+
+
+def equity_sampler(pocket, community_cards, opponents=1):
+    """
+    sampler of the share of the pot won against random opponent hands at showdown
+    """
+    community_cards = list(community_cards)
+    pocket = list(pocket)
+    deck = _remaining(pocket + community_cards)
+    unopened_slots = 5 - len(community_cards)
+    evaluate = evaluator.evaluate
+
+    def sample(rng):
+        drawn = rng.sample(deck, unopened_slots + 2 * opponents)
+        board = community_cards + drawn[:unopened_slots]
+        mine = evaluate(pocket + board)
+        ties = 1
+        for offset in range(unopened_slots, len(drawn), 2):
+            theirs = evaluate(drawn[offset:offset + 2] + board)
+            if theirs > mine:
+                return 0.0
+            if theirs == mine:
+                ties += 1
+        return 1.0 / ties
+    return sample
+
+
+def sample_rank(pocket, community_cards, **budget):
+    """
+    Monte Carlo version of utils.naive_rank
+    :param budget: see monte_carlo
+    :return: Estimate of the average hand category
+    """
+    return monte_carlo(rank_sampler(pocket, community_cards), **budget)
+
+
+def sample_equity(pocket, community_cards, opponents=1, **budget):
+    """
+    :param opponents: number of opponents holding random cards
+    :param budget: see monte_carlo
+    :return: Estimate of the share of the pot won at showdown
+    """
+    return monte_carlo(equity_sampler(pocket, community_cards, opponents), **budget)
@@ -0,0 +1,110 @@
+"""
+Suit isomorphism.
+
+Two situations that only differ by a renaming of suits have the same hand values. This
+module maps situations to a canonical representative (usable as a cache key) and
+enumerates board completions one suit isomorphism class at a time, each with the number
+of completions it stands for.
+"""
+from itertools import combinations
+
+from minipoker.logic.deck import Card, RANK_SHIFT, RANK_MASK, SUIT_MASK, SUIT_SHIFT
+
+_SUIT_BY_BIT = {1 << suit: suit for suit in range(4)}
+_ALL_RANKS = (1 << 13) - 1
+
+
+def _signatures(groups):
+    """
+    :param groups: sequences of cards playing different roles (pocket, board, dead ...)
+    :return: per suit, a tuple holding the rank bits of the suit in each group
+    """
+    masks = [[0] * len(groups) for _ in range(4)]
+    for position, group in enumerate(groups):
+        for card in group:
+            masks[_SUIT_BY_BIT[(card & SUIT_MASK) >> SUIT_SHIFT]][position] |= 1 << ((card >> RANK_SHIFT) & RANK_MASK)
+    return [tuple(suit_masks) for suit_masks in masks]
+
+
+def canonical_key(pocket, board=(), dead=()):
+    """
+    :return: hashable key shared by exactly the situations that are equal up to suit renaming
+    """
+    return tuple(sorted(_signatures((pocket, board, dead)), reverse=True))
+
+
+def canonicalize(pocket, board=(), dead=()):
+    """
+    :return: (pocket, board, dead) of the representative situation, each a sorted tuple of cards
+    """
+    groups = ([], [], [])
+    for suit, signature in enumerate(canonical_key(pocket, board, dead)):
+        for group, rank_bits in zip(groups, signature):
+            group.extend(Card(rank + 1, suit) for rank in range(13) if rank_bits & (1 << rank))
+    return tuple(tuple(sorted(group)) for group in groups)
+
+
+def suit_classes(*groups):
+    """
+    :param groups: sequences of known cards playing different roles
+    :return: lists of suits that can be renamed into each other without changing the situation
+    """
+    classes = {}
+    for suit, signature in enumerate(_signatures(groups)):
+        classes.setdefault(signature, []).append(suit)
+    return list(classes.values())
+
+
+def _subsets(suit, bits, up_to):
+    """
+    :return: per size (0 - up_to), the (size, rank bits) key and cards of every subset of bits in
+             suit with that many ranks, ordered by key
+    """
+    ranks = [rank for rank in range(13) if bits & (1 << rank)]
+    by_size = []
+    for size in range(min(up_to, len(ranks)) + 1):
+        subsets = [(sum(1 << rank for rank in chosen), tuple(Card(rank + 1, suit) for rank in chosen))
+                   for chosen in combinations(ranks, size)]
+        by_size.append([((size, subset_bits), cards) for subset_bits, cards in sorted(subsets)])
+    return by_size
+
+
+def completions(count, *groups):
+    """
+    enumerate the ways to draw count more cards, one per suit isomorphism class
+    :param count: number of cards to draw
+    :param groups: sequences of known cards playing different roles (all are excluded from the draw)
+    :return: generator of (drawn cards, number of draws equivalent to them)
+    """
+    used = [0] * 4
+    for group in groups:
+        for suit, signature in enumerate(_signatures((group,))):
+            used[suit] |= signature[0]
+    # one slot per suit: subsets it can draw and its position in its class
+    slots = [(_subsets(suit, _ALL_RANKS & ~used[suit], count), index)
+             for suit_class in suit_classes(*groups) for index, suit in enumerate(suit_class)]
+    last = len(slots) - 1
+
+    def fill(position, remaining, cards, numerator, denominator, previous_key, run):
+        by_size, index = slots[position]
+        # only the last suit has to take all remaining cards
+        for size in ([remaining] if position == last else range(remaining + 1)):
+            if size >= len(by_size):
+                return
+            for key, suit_cards in by_size[size]:
+                if index:
+                    # within a class, only non increasing keys: the other orders are renamings.
+                    # the weight is class size! / product of (runs of equal keys)!
+                    if key > previous_key:
+                        return
+                    key_run = run + 1 if key == previous_key else 1
+                    key_numerator, key_denominator = numerator * (index + 1), denominator * key_run
+                else:
+                    key_run, key_numerator, key_denominator = 1, numerator, denominator
+                if position == last:
+                    yield cards + suit_cards, key_numerator // key_denominator
+                else:
+                    for result in fill(position + 1, remaining - size, cards + suit_cards,
+                                       key_numerator, key_denominator, key, key_run):
+                        yield result
+    return fill(0, count, (), 1, 1, None, 0)
@@ -0,0 +1,141 @@
+"""
+Precomputed preflop values for the 169 starting hand classes.
+
+The table is a small binary file built once (python -m minipoker.logic.ai.preflop) and
+memory mapped at runtime. Layout (little endian):
+
+    magic       4 bytes   b'MPPF'
+    version     uint16
+    classes     uint16    169
+    columns     uint16    10
+    samples     uint32    Monte Carlo samples per equity entry
+    values      float32   classes x columns, row major
+
+Column 0 holds the exact preflop hand value computed by utils.naive_rank, column n
+(1 - 9) holds the equity against n opponents holding random cards.
+
+A class is indexed on a 13 x 13 grid: pairs on the diagonal, suited hands with the higher
+rank as the row, off suit hands with the higher rank as the column.
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+
+from minipoker.logic.deck import Card, Suits
+
+MAGIC = b'MPPF'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHI')
+VALUE = struct.Struct('<f')
+CLASSES = 169
+MAX_OPPONENTS = 9
+COLUMNS = MAX_OPPONENTS + 1
+
+PATH = os.path.join(os.path.dirname(__file__), 'data', 'preflop.bin')
+
+
+class InvalidTableException(Exception):
+    pass
+
+
+def hand_class(card1, card2):
+    """
+    :return: index (0 - 168) of the starting hand class of the two cards
+    """
+    high, low = max(card1.rank, card2.rank), min(card1.rank, card2.rank)
+    if card1.suit == card2.suit:
+        return high * 13 + low
+    return low * 13 + high
+
+
+def representative(index):
+    """
+    :return: two cards of the starting hand class
+    """
+    row, column = divmod(index, 13)
+    if row > column:
+        # suited
+        return Card(row + 1, Suits.SPADES), Card(column + 1, Suits.SPADES)
+    return Card(column + 1, Suits.SPADES), Card(row + 1, Suits.HEARTS)
+
+
+class PreflopTable(object):
+    def __init__(self, path=PATH):
+        with open(path, 'rb') as table_file:
+            self.data = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, classes, columns, self.samples = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION or classes != CLASSES or columns != COLUMNS:
+            raise InvalidTableException("Not a preflop table (or unsupported version): %s" % path)
+        if len(self.data) != HEADER.size + CLASSES * COLUMNS * VALUE.size:
+            raise InvalidTableException("Truncated preflop table: %s" % path)
+
+    def value(self, index, column):
+        return VALUE.unpack_from(self.data, HEADER.size + (index * COLUMNS + column) * VALUE.size)[0]
+
+    def hand_value(self, pocket):
+        """
+        :return: utils.naive_rank of the pocket with no community cards
+        """
+        return self.value(hand_class(*pocket), 0)
+
+    def equity(self, pocket, opponents=1):
+        """
+        :return: share of the pot won at showdown against opponents random hands
+        """
+        if not 1 <= opponents <= MAX_OPPONENTS:
+            raise ValueError("opponents must be in 1 - %d" % MAX_OPPONENTS)
+        return self.value(hand_class(*pocket), opponents)
+
+    def close(self):
+        self.data.close()
+
+
+_table = None
+
+
+def table():
+    """
+    :return: the packaged preflop table (mapped on first use), None if it was not built
+    """
+    global _table
+    if _table is None and os.path.exists(PATH):
+        _table = PreflopTable(PATH)
+    return _table
+
+
+def _build_row(args):
+    from minipoker.logic.ai import equity, utils
+    index, samples = args
+    pocket = representative(index)
+    rng = random.Random(index)
+    row = [utils.naive_rank(pocket, ())]
+    for opponents in range(1, MAX_OPPONENTS + 1):
+        row.append(equity.sample_equity(pocket, (), opponents, max_samples=samples, rng=rng).mean)
+    return row
+
+
+def build(path=PATH, samples=20000, processes=None):
+    """
+    compute every class and write the table to path
+    """
+    import multiprocessing
+    with multiprocessing.Pool(processes) as pool:
+        rows = pool.map(_build_row, [(index, samples) for index in range(CLASSES)])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as table_file:
+        table_file.write(HEADER.pack(MAGIC, VERSION, CLASSES, COLUMNS, samples))
+        for row in rows:
+            table_file.write(struct.pack('<%df' % COLUMNS, *row))
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="Build the preflop table")
+    parser.add_argument('--samples', type=int, default=20000, help="Monte Carlo samples per equity entry")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--path', default=PATH)
+    arguments = parser.parse_args()
+    # build through the imported module, so the pool workers can find _build_row
+    from minipoker.logic.ai import preflop
+    preflop.build(arguments.path, arguments.samples, arguments.processes)
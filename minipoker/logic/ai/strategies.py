@@ -1,11 +1,13 @@
-import logging
 import random
-from minipoker.logic.ai import utils
-import multiprocessing
+from minipoker.logic.ai import cache, equity, preflop, workers
+from minipoker.logic.deck import Card
+from minipoker.logic import stats as roundstats
+from minipoker.logic import trace
 
-pool = multiprocessing.Pool(max(multiprocessing.cpu_count() // 2, 1))
+TRACE = trace.tracer("ai-strategies")
 
-LOGGER = logging.getLogger("ai-strategies")
+# share of the time left to act that one sampled hand value may take
+TIME_SHARE = 0.25
 
 
 class CFRDistribution:
@@ -16,22 +18,25 @@ class CFRDistribution:
         self.fold = int(fold * 100)
         self.bet = int(bet * 100)
         self.check = int(check * 100)
-        self.distributions = {
-            self.call: Call,
-            self.fold: Fold,
-            self.bet: Bet,
-            self.check: Check
-        }
-
-    def decision(self):
-        s = random.randint(1, sum((self.call, self.fold, self.bet, self.check,)))
-        print(self.distributions)
-        for (weight, value) in self.distributions.items():
+        # (weight, action) pairs, weights may repeat
+        self.distributions = [
+            (self.call, Call),
+            (self.fold, Fold),
+            (self.bet, Bet),
+            (self.check, Check),
+        ]
+
+    def decision(self, rng=None):
+        s = (rng or random).randint(1, sum((self.call, self.fold, self.bet, self.check,)))
+        for (weight, value) in self.distributions:
             s -= weight
             if s <= 0:
                 return value
         raise Exception("Error while fetching decision")
 
+    def __str__(self):
+        return ", ".join("%s %d%%" % (action.name, weight) for weight, action in self.distributions)
+
 
 class PokerStrategy:
     def __init__(self, call_bias, fold_bias, bet_bias, check_bias):
@@ -45,22 +50,66 @@ class PokerStrategy:
 
 
 def make_args_from_cards(cards):
-    return tuple((c.value, c.suit) for c in cards)
+    return tuple(int(c) for c in cards)
 
 
 class SimpleSaneStrategy(PokerStrategy):
+    def __init__(self, call_bias, fold_bias, bet_bias, check_bias, hand_values=None, **budget):
+        """
+        :param hand_values: HandValueCache to use (defaults to the shared cache.default_cache())
+        :param budget: sampling budget per hand value (max_samples, time_budget and/or target_error,
+                       see equity.monte_carlo). Without one, hand values are enumerated exactly.
+        """
+        super(SimpleSaneStrategy, self).__init__(call_bias, fold_bias, bet_bias, check_bias)
+        self.hand_values = hand_values
+        self.budget = budget
+
+    def hand_value(self, pocket, community_cards, stats=roundstats.NULL_STATS, time_left=None):
+        """
+        :param stats: counts the hand values and the equity calls (the cache misses) made
+        :param time_left: seconds left to act (see Round.time_left), caps the sampling time of a
+                          sampled hand value to TIME_SHARE of it
+        """
+        stats.count(roundstats.HAND_VALUES)
+        if not community_cards and len(pocket) == 2:
+            table = preflop.table()
+            if table is not None:
+                return table.hand_value([Card.from_code(code) for code in pocket])
+        hand_values = self.hand_values or cache.default_cache()
+        if not self.budget:
+            def compute():
+                stats.count(roundstats.EQUITY_CALLS)
+                return workers.naive_rank(pocket, community_cards)
+            # the naive rank only depends on the union of the cards
+            return hand_values.get(cache.situation_key('naive_rank', pocket + community_cards, ()), compute)
+        key = cache.situation_key('sample_rank', pocket, community_cards, sorted(self.budget.items()))
+        budget = self.budget
+        if time_left is not None and (budget.get('time_budget') is None or
+                                      time_left * TIME_SHARE < budget['time_budget']):
+            budget = dict(budget, time_budget=time_left * TIME_SHARE)
+        # estimates cut short by the time left depend on the clock, they are not kept
+        rushed = []
+
+        def compute():
+            stats.count(roundstats.EQUITY_CALLS)
+            # seed the samples with the situation, so estimates are reproducible whatever the cache holds
+            estimate = equity.sample_rank(pocket, community_cards, rng=random.Random(key), **budget)
+            if estimate.stopped == equity.TIME_BUDGET and budget is not self.budget:
+                rushed.append(estimate)
+            return estimate.mean
+        return hand_values.get(key, compute, keep=lambda: not rushed)
+
     def rank(self, _game):
         _round = _game.current_round
+        time_left = _round.betting_player.time_left(_round)
         # ranks are 0 - 8 in naive rank
-        v = utils.naive_rank(make_args_from_cards(_round.betting_player.pocket),
-                                                     make_args_from_cards(_round.community_cards))
+        v = self.hand_value(make_args_from_cards(_round.betting_player.pocket),
+                            make_args_from_cards(_round.community_cards), _game.stats, time_left)
         if _round.community_cards:
             # if community cards exist - remove their detached value from hand value
-            community_v =utils.naive_rank(make_args_from_cards(_round.community_cards), tuple())
+            community_v = self.hand_value(make_args_from_cards(_round.community_cards), tuple(), _game.stats,
+                                          _round.betting_player.time_left(_round))
             v = v - community_v
-        else:
-            print("no community cards, fetching hand value")
-        print("v: %f" % v)
 
         if v < 0.7:
             dist = CFRDistribution(0.05, 0.7, 0.05, 0.2)
@@ -72,8 +121,10 @@ class SimpleSaneStrategy(PokerStrategy):
             dist = CFRDistribution(0.35, 0.1, 0.25, 0.4)
         else:
             dist = CFRDistribution(0.45, 0.05, 0.3, 0.1)
-        print("ai player dist: %s" % dist)
-        return dist.decision()
+        action = dist.decision(_round.betting_player.rng)
+        TRACE.sampled('decision', player=_round.betting_player.name, value=v, distribution=dist,
+                      action=action.name)
+        return action
 
 # def randomize_sample(community_count):
 #     _deck = deck.Deck()
@@ -1,41 +1,60 @@
-from minipoker.logic.deck import Deck, Card, Suits
+from minipoker.logic.deck import Card, Suits
 import itertools
 from minipoker.logic.hands import Hand
+from minipoker.logic import evaluator
+from minipoker.logic.ai import isomorphism
+from minipoker.logic import trace
 
-import logging
-
-LOGGER = logging.getLogger("ai-utils")
-LOGGER.setLevel(logging.WARN)
+TRACE = trace.tracer("ai-utils")
 
 
 def generate_possible_hands(pocket, community_cards):
     return [Hand.get_hand(cards) for cards in itertools.combinations(community_cards + pocket, r=5)]
 
 
-def naive_rank(pocket, community_cards):
-    print("Evaluating")
-    pocket = [Card(v, s) for v, s in pocket]
-    community_cards = [Card(v, s) for v, s in community_cards]
-    unopened_slots = min(3, 7 - len(pocket) - len(community_cards))
-    deck = Deck()
-    deck.removeall(pocket + community_cards)
-    count = 0
+def unopened_slots(known_cards):
+    """
+    :return: how many cards naive_rank opens on top of the known cards
+    """
+    return min(3, 7 - len(known_cards))
+
+
+def rank_completions(known_cards, completions):
+    """
+    :param known_cards: cards in hand and on the board
+    :param completions: sequence of (additional cards, weight)
+    :return: (weighted sum of the hand categories, total weight, number of completions)
+    """
+    known_cards = list(known_cards)
+    evaluate, category = evaluator.evaluate, evaluator.category
     _rank = 0
-    for possibility in itertools.combinations(deck.cards, r=unopened_slots):
-        _rank += max(generate_possible_hands(pocket, community_cards + list(possibility))).rank
-        count += 1
-    LOGGER.debug("Evaluated %d hands" % count)
+    count = 0
+    classes = 0
+    for possibility, weight in completions:
+        _rank += weight * category(evaluate(known_cards + list(possibility)))
+        count += weight
+        classes += 1
+    return _rank, count, classes
+
+
+def naive_rank(pocket, community_cards):
+    pocket = [Card.from_code(code) for code in pocket]
+    community_cards = [Card.from_code(code) for code in community_cards]
+    known = pocket + community_cards
+    # completions that only differ by suit renaming have the same rank, evaluate each class once
+    _rank, count, classes = rank_completions(known, isomorphism.completions(unopened_slots(known), known))
+    TRACE.debug('naive_rank', known=len(known), hands=count, classes=classes)
 
     return _rank / count
 
 
 if "__main__" == __name__:
     test_cards = (
-        [Card(14, Suits.HEARTS), Card(13, Suits.SPADES)],
+        [Card(13, Suits.HEARTS), Card(12, Suits.CLUBS)],
         [Card(12, Suits.SPADES), Card(13, Suits.SPADES)],
         [Card(2, Suits.HEARTS), Card(2, Suits.SPADES)],
     )
     for cards in test_cards:
         for comm in [[], [Card(13, Suits.HEARTS)],
-                     [Card(10, Suits.SPADES), Card(11, Suits.SPADES), Card(14, Suits.SPADES)]]:
+                     [Card(10, Suits.SPADES), Card(11, Suits.SPADES), Card(13, Suits.SPADES)]]:
             print("Naive rank %s with %s: %f" % (str(cards), comm, naive_rank(cards, comm)))
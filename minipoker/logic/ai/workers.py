@@ -0,0 +1,113 @@
+"""
+Process pool for hand value computations.
+
+The pool is only started the first time work is submitted to it, and is shut down at exit
+(or explicitly with shutdown). Callers stay synchronous: they submit chunks of work and
+wait for the combined result.
+"""
+import atexit
+import multiprocessing
+import threading
+
+from minipoker.logic.deck import Card
+from minipoker.logic import trace
+from minipoker.logic.ai import isomorphism, utils
+
+TRACE = trace.tracer("ai-workers")
+
+# chunks submitted per worker process, more chunks balance better but cost more messages
+CHUNKS_PER_PROCESS = 4
+
+
+class WorkerPool(object):
+    def __init__(self, processes=None):
+        """
+        :param processes: number of worker processes (defaults to half the cpus). With a single
+                          process, work runs inline in the calling process.
+        """
+        self.processes = max(multiprocessing.cpu_count() // 2, 1) if processes is None else processes
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def parallel(self):
+        return self.processes > 1
+
+    @property
+    def started(self):
+        return self._pool is not None
+
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                TRACE.info('pool_started', processes=self.processes)
+                self._pool = multiprocessing.Pool(self.processes)
+                atexit.register(self.shutdown)
+            return self._pool
+
+    def map(self, func, items):
+        if not self.parallel:
+            return [func(item) for item in items]
+        return self.pool().map(func, items)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                TRACE.info('pool_stopped', processes=self.processes)
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+                atexit.unregister(self.shutdown)
+
+
+_default = None
+
+
+def default_pool():
+    """
+    :return: the pool shared by strategies (not started until it is used)
+    """
+    global _default
+    if _default is None:
+        _default = WorkerPool()
+    return _default
+
+
+def configure(processes=None):
+    """
+    replace the shared pool (e.g. with a single, inline process inside pool workers, which can
+    not start processes of their own)
+    """
+    global _default
+    shutdown()
+    _default = WorkerPool(processes)
+    return _default
+
+
+def shutdown():
+    if _default is not None:
+        _default.shutdown()
+
+
+def _rank_chunk(args):
+    known_codes, chunk = args
+    _rank, count, _ = utils.rank_completions([Card.from_code(code) for code in known_codes],
+                                             [([Card.from_code(code) for code in codes], weight)
+                                              for codes, weight in chunk])
+    return _rank, count
+
+
+def naive_rank(pocket, community_cards, pool=None):
+    """
+    utils.naive_rank, with the board completions split in chunks across the pool's processes
+    """
+    pool = pool or default_pool()
+    if not pool.parallel:
+        return utils.naive_rank(pocket, community_cards)
+    known = [int(code) for code in pocket] + [int(code) for code in community_cards]
+    completions = [(tuple(int(card) for card in cards), weight)
+                   for cards, weight in isomorphism.completions(utils.unopened_slots(known), known)]
+    size = -(-len(completions) // (pool.processes * CHUNKS_PER_PROCESS))
+    results = pool.map(_rank_chunk, [(known, completions[start:start + size])
+                                     for start in range(0, len(completions), size)])
+    return sum(_rank for _rank, _ in results) / sum(count for _, count in results)
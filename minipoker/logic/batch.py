@@ -0,0 +1,57 @@
+"""
+Vectorized hand evaluation over many hands at once (requires numpy).
+
+evaluate_batch scores every row of an (N, 5..7) array of encoded cards with the same
+tables used by minipoker.logic.evaluator, so the results are identical to calling
+evaluator.evaluate (and Hand.best_hand) on each row.
+"""
+import numpy as np
+
+from minipoker.logic import evaluator
+from minipoker.logic.deck import PRIME_MASK, BITS_SHIFT
+
+_BEST_FLUSHES = np.array(evaluator.BEST_FLUSHES, dtype=np.int32)
+_PRODUCTS = np.array(sorted(evaluator.BEST_RANKS), dtype=np.int64)
+_PRODUCT_STRENGTHS = np.array([evaluator.BEST_RANKS[product] for product in _PRODUCTS], dtype=np.int32)
+
+
+def to_array(hands):
+    """
+    :param hands: sequence of equally sized card sequences
+    :return: (N, cards per hand) array of encoded cards
+    """
+    return np.array([[int(card) for card in hand] for hand in hands], dtype=np.int64)
+
+
+def evaluate_batch(cards_array):
+    """
+    :param cards_array: (N, 5..7) integer array of encoded cards, one hand per row
+    :return: (N,) int32 array of hand strengths
+    """
+    cards = np.asarray(cards_array, dtype=np.int64)
+    if cards.ndim != 2 or not 5 <= cards.shape[1] <= 7:
+        raise ValueError("Expected an (N, 5..7) array of cards, got shape %s" % (cards.shape,))
+
+    # mixed suit hands: look the product of the rank primes up in the sorted products
+    products = np.prod(cards & PRIME_MASK, axis=1)
+    positions = np.minimum(np.searchsorted(_PRODUCTS, products), len(_PRODUCTS) - 1)
+    if np.any(_PRODUCTS[positions] != products):
+        raise ValueError("Invalid hand (repeated cards?) in batch")
+    strengths = _PRODUCT_STRENGTHS[positions]
+
+    # flushes: at most one suit can hold five of up to seven cards
+    for suit in evaluator.SUIT_BITS:
+        suited = (cards & suit) != 0
+        flushes = np.count_nonzero(suited, axis=1) >= 5
+        if flushes.any():
+            bits = np.bitwise_or.reduce(np.where(suited[flushes], cards[flushes], 0), axis=1) >> BITS_SHIFT
+            strengths[flushes] = _BEST_FLUSHES[bits]
+    return strengths
+
+
+def categories(strengths):
+    """
+    :param strengths: array of hand strengths
+    :return: array of hand categories (see evaluator.HIGH_CARD ... evaluator.STRAIGHT_FLUSH)
+    """
+    return np.asarray(strengths) >> evaluator.CATEGORY_SHIFT
@@ -1,57 +1,242 @@
-from random import shuffle
+import random
 
 
 class Suits:
-    HEARTS = "Hearts"
-    DIAMONDS = "Diamonds"
-    CLUBS = "Clubs"
-    SPADES = "Spades"
+    SPADES = 0
+    HEARTS = 1
+    DIAMONDS = 2
+    CLUBS = 3
     SUITS = (HEARTS, DIAMONDS, CLUBS, SPADES)
+    NAMES = ("Spades", "Hearts", "Diamonds", "Clubs")
+
+    @staticmethod
+    def parse(suit):
+        """
+        normalize a suit given either as an index or by name ('Hearts', 'h', ...)
+        :param suit: suit index or suit name (only the first letter matters)
+        :return: suit index
+        """
+        if isinstance(suit, int):
+            if not 0 <= suit < 4:
+                raise ValueError("Invalid suit: %r" % suit)
+            return suit
+        try:
+            return "shdc".index(suit[0].lower())
+        except (ValueError, IndexError, TypeError):
+            raise ValueError("Invalid suit: %r" % suit)
 
 symbols = {Suits.SPADES: u'♠', Suits.HEARTS: u'♥', Suits.DIAMONDS: u'♦', Suits.CLUBS: u'♣'}
 
-
-class Card(object):
-    def __init__(self, value, suit):
-        self.value = value
-        self.suit = suit
-
-    def __gt__(self, other):
-        if not isinstance(other, Card):
-            return False
-        return self.value > other.value
-
-    def __eq__(self, other):
-        return isinstance(other, Card) and self.value == other.value and self.suit == other.suit
+# card values run from 1 (lowest) to 13 (highest)
+VALUES = range(1, 14)
+PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+# a card is encoded in a single 32 bit integer:
+#
+#   xxxbbbbb bbbbbbbb ssssrrrr xxpppppp
+#
+#   b - one bit per rank (value - 1)
+#   s - one bit per suit
+#   r - rank (value - 1), 0 - 12
+#   p - prime of the rank (deuce = 2, trey = 3, ..., top card = 41)
+RANK_SHIFT = 8
+SUIT_SHIFT = 12
+BITS_SHIFT = 16
+PRIME_MASK = 0x3F
+RANK_MASK = 0xF
+SUIT_MASK = 0xF000
+BITS_MASK = 0x1FFF0000
+
+
+def encode(value, suit):
+    """
+    :param value: card value (1 - 13)
+    :param suit: suit index (see Suits)
+    :return: integer encoding of the card
+    """
+    rank = value - 1
+    return 1 << (BITS_SHIFT + rank) | 1 << (SUIT_SHIFT + suit) | rank << RANK_SHIFT | PRIMES[rank]
+
+
+# suit bit (as in the encoding, shifted down) -> suit index
+_SUIT_BY_BIT = {1 << suit: suit for suit in range(4)}
+
+# all card instances, keyed both by (value, suit) and by code
+_INTERNED = {}
+_BY_CODE = {}
+_BY_INDEX = []
+
+
+class Card(int):
+    """
+    A playing card, stored as its integer encoding (see encode).
+
+    Cards are interned: Card(value, suit) always returns the same instance, so creating
+    cards does not allocate, and hashing or comparing them is plain integer work.
+    Sorting cards orders them by value first.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, value, suit):
+        try:
+            return _INTERNED[value, suit]
+        except (KeyError, TypeError):
+            pass
+        if value not in VALUES:
+            raise ValueError("Invalid card value: %r" % (value,))
+        suit_index = Suits.parse(suit)
+        card = _INTERNED.get((value, suit_index))
+        if card is None:
+            card = int.__new__(cls, encode(value, suit_index))
+            _INTERNED[value, suit_index] = card
+        else:
+            # remember alternate suit spellings ('h', 'Hearts', ...)
+            _INTERNED[value, suit] = card
+        return card
+
+    @staticmethod
+    def from_code(code):
+        """
+        :param code: integer encoding of a card (or a Card)
+        :return: matching Card
+        """
+        try:
+            return _BY_CODE[code]
+        except KeyError:
+            raise ValueError("Invalid card code: %r" % (code,))
+
+    @staticmethod
+    def from_index(index):
+        """
+        :param index: dense card index (0 - 51), see Card.index
+        :return: matching Card
+        """
+        return _BY_INDEX[index]
+
+    @property
+    def value(self):
+        return ((self >> RANK_SHIFT) & RANK_MASK) + 1
+
+    @property
+    def rank(self):
+        """ value - 1, in range 0 - 12 """
+        return (self >> RANK_SHIFT) & RANK_MASK
+
+    @property
+    def suit(self):
+        return _SUIT_BY_BIT[(self & SUIT_MASK) >> SUIT_SHIFT]
+
+    @property
+    def prime(self):
+        return self & PRIME_MASK
+
+    @property
+    def index(self):
+        """ dense index of the card (0 - 51), rank major """
+        return self.rank * 4 + self.suit
+
+    def __reduce__(self):
+        return Card.from_code, (int(self),)
 
     def __repr__(self):
-        return str(self.value) + self.suit[0]
+        return str(self.value) + Suits.NAMES[self.suit][0]
 
     def __str__(self):
         return str(self.value) + symbols[self.suit]
 
-    def __hash__(self):
-        return hash(self.value) ^ hash(self.suit)
-
     def color(self):
         return "red" if self.suit in (Suits.HEARTS, Suits.DIAMONDS) else "black"
 
 
+for _value in VALUES:
+    for _suit in range(4):
+        _card = Card(_value, _suit)
+        _BY_CODE[_card] = _card
+        _BY_INDEX.append(_card)
+
+# every card in a deck, in index order
+CARDS = tuple(_BY_INDEX)
+
+
+# card -> index in CARDS
+_INDEX = {card: index for index, card in enumerate(CARDS)}
+
+
+def mask(cards):
+    """
+    :return: 52 bit mask of the cards (bit n is CARDS[n])
+    """
+    bits = 0
+    for card in cards:
+        bits |= 1 << _INDEX[card]
+    return bits
+
+
 class Deck(object):
-    def __init__(self):
-        self.cards = [Card(value, suit) for value in range(1, 14) for suit in Suits.SUITS]
-        # don't forget to shuffle
-        self.shuffle()
+    """
+    A deck stored in a preallocated array of all the cards, with a cursor: cards before the
+    cursor are dealt (or removed), cards from the cursor on are still in the deck. Drawing
+    swaps a random remaining card to the cursor, one step of a Fisher-Yates shuffle, so only
+    the cards actually dealt are shuffled. dead is a 52 bit mask of the cards out of the deck.
+    """
+
+    def __init__(self, rng=None):
+        """
+        :param rng: random generator used for shuffling (defaults to the random module)
+        """
+        self.rng = rng or random
+        self.array = list(CARDS)
+        # card index -> position of the card in self.array
+        self.positions = list(range(len(CARDS)))
+        self.cursor = 0
+        self.dead = 0
+
+    def reset(self):
+        """
+        put every card back in the deck (no allocation, the deck is reshuffled as it is drawn)
+        """
+        self.cursor = 0
+        self.dead = 0
+
+    @property
+    def cards(self):
+        """
+        cards still in the deck
+        """
+        return self.array[self.cursor:]
+
+    def __len__(self):
+        return len(self.array) - self.cursor
+
+    def _take(self, position):
+        array, positions, cursor = self.array, self.positions, self.cursor
+        card, other = array[position], array[cursor]
+        array[cursor], array[position] = card, other
+        positions[_INDEX[other]] = position
+        index = _INDEX[card]
+        positions[index] = cursor
+        self.cursor = cursor + 1
+        self.dead |= 1 << index
+        return card
 
     def shuffle(self):
-        shuffle(self.cards)
+        remaining = self.array[self.cursor:]
+        self.rng.shuffle(remaining)
+        self.array[self.cursor:] = remaining
+        for position, card in enumerate(remaining, self.cursor):
+            self.positions[_INDEX[card]] = position
 
     def draw(self, number=1):
-        drawn, self.cards = self.cards[:number], self.cards[number:]
-        return drawn
+        return [self.draw_single() for _ in range(min(number, len(self)))]
 
     def draw_single(self):
-        return self.cards.pop()
+        if self.cursor >= len(self.array):
+            raise IndexError("draw from an empty deck")
+        return self._take(self.rng.randrange(self.cursor, len(self.array)))
+
+    def is_dead(self, card):
+        return bool(self.dead >> _INDEX[card] & 1)
 
     def removeall(self, cards):
         '''
@@ -59,6 +244,8 @@ class Deck(object):
         :param cards: cards to remove from the deck
         :return: sequence of remaining cards
         '''
-        remaining = set(self.cards) - set(cards)
-        self.cards = list(remaining)
-        return remaining
+        for card in cards:
+            index = _INDEX[card]
+            if not self.dead >> index & 1:
+                self._take(self.positions[index])
+        return self.cards
@@ -0,0 +1,291 @@
+"""
+Table driven hand evaluation.
+
+A hand's strength is a single integer: the hand category in the high bits and the
+ranks that break ties inside the category (most repeated first, then highest first)
+as 4 bit nibbles below it. Comparing two hands is comparing two integers.
+
+Cards are expected in the integer encoding used by minipoker.logic.deck.Card.
+evaluate5 scores exactly five cards; evaluate scores the best five out of five to
+seven cards directly, without going through the five card subsets.
+"""
+from collections import Counter
+from itertools import combinations, combinations_with_replacement
+from functools import reduce
+from operator import mul
+
+from minipoker.logic.deck import PRIMES, PRIME_MASK, RANK_MASK, RANK_SHIFT, SUIT_MASK, SUIT_SHIFT, BITS_SHIFT
+
+HIGH_CARD = 0
+PAIR = 1
+TWO_PAIRS = 2
+THREE_OF_A_KIND = 3
+STRAIGHT = 4
+FLUSH = 5
+FULL_HOUSE = 6
+FOUR_OF_A_KIND = 7
+STRAIGHT_FLUSH = 8
+
+CATEGORY_SHIFT = 20
+
+# rank bit patterns of the straights (values 1-5 up to 9-13)
+STRAIGHTS = frozenset(0x1F << low for low in range(9))
+
+
+def category(strength):
+    """
+    :param strength: hand strength, as returned by evaluate5
+    :return: hand category (HIGH_CARD ... STRAIGHT_FLUSH)
+    """
+    return strength >> CATEGORY_SHIFT
+
+
+def _strength(hand_category, ranks):
+    """
+    :param hand_category: hand category
+    :param ranks: tie breaking ranks, most significant first
+    :return: hand strength
+    """
+    strength = hand_category << CATEGORY_SHIFT
+    for shift, rank in zip(range(16, -1, -4), ranks):
+        strength |= rank << shift
+    return strength
+
+
+def _classify(ranks, flush):
+    """
+    reference classification of five ranks (used to build the tables)
+    :param ranks: five ranks (0 - 12), may repeat
+    :param flush: whether all five cards share a suit
+    :return: hand strength
+    """
+    counts = Counter(ranks)
+    ordered = sorted(counts, key=lambda rank: (counts[rank], rank), reverse=True)
+    shape = sorted(counts.values(), reverse=True)
+    straight = len(counts) == 5 and sum(1 << rank for rank in ranks) in STRAIGHTS
+    if straight and flush:
+        return _strength(STRAIGHT_FLUSH, ordered[:1])
+    if shape[0] == 4:
+        return _strength(FOUR_OF_A_KIND, ordered)
+    if shape == [3, 2]:
+        return _strength(FULL_HOUSE, ordered)
+    if flush:
+        return _strength(FLUSH, ordered)
+    if straight:
+        return _strength(STRAIGHT, ordered[:1])
+    if shape[0] == 3:
+        return _strength(THREE_OF_A_KIND, ordered)
+    if shape[:2] == [2, 2]:
+        return _strength(TWO_PAIRS, ordered)
+    if shape[0] == 2:
+        return _strength(PAIR, ordered)
+    return _strength(HIGH_CARD, ordered)
+
+
+def _build_tables():
+    flushes = [0] * (1 << 13)
+    unique5 = [0] * (1 << 13)
+    repeated = {}
+    for ranks in combinations(range(13), 5):
+        bits = sum(1 << rank for rank in ranks)
+        flushes[bits] = _classify(ranks, True)
+        unique5[bits] = _classify(ranks, False)
+    for ranks in combinations_with_replacement(range(13), 5):
+        counts = Counter(ranks)
+        if len(counts) < 5 and max(counts.values()) <= 4:
+            repeated[reduce(mul, (PRIMES[rank] for rank in ranks))] = _classify(ranks, False)
+    return flushes, unique5, repeated
+
+
+def _build_best_tables():
+    """
+    the best hand in six or seven cards is the best hand in one of the subsets missing a
+    single card, so each size is built from the one below it
+    """
+    best_flushes = list(FLUSHES)
+    best_ranks = dict(REPEATED)
+    for bits, strength in enumerate(UNIQUE5):
+        if strength:
+            best_ranks[reduce(mul, (PRIMES[rank] for rank in range(13) if bits & (1 << rank)))] = strength
+    for size in (6, 7):
+        for ranks in combinations(range(13), size):
+            bits = sum(1 << rank for rank in ranks)
+            best_flushes[bits] = max(best_flushes[bits & ~(1 << rank)] for rank in ranks)
+        for ranks in combinations_with_replacement(range(13), size):
+            # ranks are sorted, so five of a kind shows up as equal ranks four apart
+            if all(ranks[i] != ranks[i + 4] for i in range(size - 4)):
+                product = reduce(mul, (PRIMES[rank] for rank in ranks))
+                best_ranks[product] = max(best_ranks[product // PRIMES[rank]] for rank in set(ranks))
+    return best_flushes, best_ranks
+
+
+# FLUSHES: rank bits -> strength of a flush with those ranks
+# UNIQUE5: rank bits -> strength of five distinct ranks in mixed suits
+# REPEATED: product of rank primes -> strength of a hand with repeated ranks
+FLUSHES, UNIQUE5, REPEATED = _build_tables()
+
+# BEST_FLUSHES: rank bits of 5 - 7 suited cards -> strength of the best flush in them
+# BEST_RANKS: product of rank primes of 5 - 7 cards -> strength of the best mixed suit hand
+BEST_FLUSHES, BEST_RANKS = _build_best_tables()
+
+SUIT_BITS = tuple(1 << (SUIT_SHIFT + suit) for suit in range(4))
+
+
+def evaluate5(cards):
+    """
+    :param cards: five encoded cards
+    :return: hand strength
+    """
+    c1, c2, c3, c4, c5 = cards
+    bits = (c1 | c2 | c3 | c4 | c5) >> BITS_SHIFT
+    if c1 & c2 & c3 & c4 & c5 & SUIT_MASK:
+        return FLUSHES[bits]
+    strength = UNIQUE5[bits]
+    if strength:
+        return strength
+    return REPEATED[(c1 & PRIME_MASK) * (c2 & PRIME_MASK) * (c3 & PRIME_MASK) * (c4 & PRIME_MASK) *
+                    (c5 & PRIME_MASK)]
+
+
+def evaluate(cards):
+    """
+    :param cards: five to seven encoded cards
+    :return: strength of the best five card hand in cards
+    """
+    if len(cards) == 5:
+        return evaluate5(cards)
+    suits = [card & SUIT_MASK for card in cards]
+    for suit in SUIT_BITS:
+        if suits.count(suit) >= 5:
+            # with at most two other cards, nothing beats the flush
+            bits = 0
+            for card in cards:
+                if card & suit:
+                    bits |= card
+            return BEST_FLUSHES[bits >> BITS_SHIFT]
+    product = 1
+    for card in cards:
+        product *= card & PRIME_MASK
+    return BEST_RANKS[product]
+
+
+# hand category -> how many cards of each tie breaking rank make up the hand
+_SHAPES = {
+    STRAIGHT_FLUSH: (1,),
+    FOUR_OF_A_KIND: (4, 1),
+    FULL_HOUSE: (3, 2),
+    FLUSH: (1, 1, 1, 1, 1),
+    STRAIGHT: (1,),
+    THREE_OF_A_KIND: (3, 1, 1),
+    TWO_PAIRS: (2, 2, 1),
+    PAIR: (2, 1, 1, 1),
+    HIGH_CARD: (1, 1, 1, 1, 1),
+}
+
+
+def ranks(strength):
+    """
+    :param strength: hand strength
+    :return: list of (rank, count) pairs making up the hand, most significant first
+    """
+    hand_category = category(strength)
+    if hand_category in (STRAIGHT, STRAIGHT_FLUSH):
+        high = (strength >> 16) & 0xF
+        return [(rank, 1) for rank in range(high, high - 5, -1)]
+    return [((strength >> shift) & 0xF, count) for shift, count in zip(range(16, -1, -4), _SHAPES[hand_category])]
+
+
+def best_five(cards, strength=None):
+    """
+    :param cards: five to seven encoded cards
+    :param strength: strength of the best hand in cards, when it is already known
+    :return: (strength, the five cards making up the best hand, most significant first)
+    """
+    if strength is None:
+        strength = evaluate(cards)
+    if category(strength) in (FLUSH, STRAIGHT_FLUSH):
+        suit = max(SUIT_BITS, key=lambda suit_bit: sum(1 for card in cards if card & suit_bit))
+        cards = [card for card in cards if card & suit]
+    remaining = sorted(cards, reverse=True)
+    five = []
+    for rank, count in ranks(strength):
+        matching = [card for card in remaining if (card >> RANK_SHIFT) & RANK_MASK == rank][:count]
+        five.extend(matching)
+        remaining = [card for card in remaining if card not in matching]
+    return strength, five
+
+
+class HandState(object):
+    """
+    a player's cards as the board opens: each added card updates the rank primes product and
+    the per suit rank bits, so the strength of the best hand is a single table lookup instead
+    of a fresh evaluation
+    """
+
+    __slots__ = ('cards', 'product', 'suit_ranks', 'suit_counts', 'flush_suit')
+
+    def __init__(self, cards=()):
+        self.cards = []
+        self.product = 1
+        # indexed by the suit bit of the cards shifted down (1, 2, 4 or 8)
+        self.suit_ranks = [0] * 9
+        self.suit_counts = [0] * 9
+        # the suit of five or more cards (at most one in seven cards), None without a flush
+        self.flush_suit = None
+        for card in cards:
+            self.add(card)
+
+    def add(self, card):
+        self.cards.append(card)
+        self.product *= card & PRIME_MASK
+        suit = (card & SUIT_MASK) >> SUIT_SHIFT
+        self.suit_ranks[suit] |= card >> BITS_SHIFT
+        self.suit_counts[suit] += 1
+        if self.suit_counts[suit] == 5:
+            self.flush_suit = suit
+
+    @property
+    def strength(self):
+        """
+        :return: strength of the best five cards, None before there are five
+        """
+        if len(self.cards) < 5:
+            return None
+        if self.flush_suit is not None:
+            # with at most two other cards, nothing beats the flush (as in evaluate)
+            return BEST_FLUSHES[self.suit_ranks[self.flush_suit]]
+        return BEST_RANKS[self.product]
+
+    @property
+    def category(self):
+        strength = self.strength
+        return None if strength is None else category(strength)
+
+    def best_five(self):
+        """
+        :return: the five cards making up the best hand (see best_five)
+        """
+        return best_five(self.cards, self.strength)[1]
+
+    @property
+    def flush_draw(self):
+        """
+        :return: whether a single card of a suit would complete a flush
+        """
+        return len(self.cards) < 7 and 4 in self.suit_counts
+
+    @property
+    def straight_outs(self):
+        """
+        :return: rank bits of the ranks that would complete a straight (one bit is a gutshot,
+                 two bits an open ended draw), 0 when the cards already hold a straight
+        """
+        rank_bits = self.suit_ranks[1] | self.suit_ranks[2] | self.suit_ranks[4] | self.suit_ranks[8]
+        outs = 0
+        for straight in STRAIGHTS:
+            missing = straight & ~rank_bits
+            if not missing:
+                return 0
+            if not missing & (missing - 1):
+                outs |= missing
+        return outs
@@ -1,31 +1,6 @@
-from collections import Counter
-import logging
 import unittest
-
-LOGGER = logging.getLogger('poker-hands')
-LOGGER.setLevel(logging.WARN)
-
-
-class Card(object):
-    def __init__(self, value, suit):
-        self.value = value
-        self.suit = suit
-
-    def __hash__(self):
-        return hash(self.value)
-
-    def __gt__(self, other):
-        if not isinstance(other, Card):
-            return False
-        return self.value > other.value
-
-    def __eq__(self, other):
-        if not isinstance(other, Card):
-            return False
-        return self.value == other.value and self.suit == other.suit
-
-    def __repr__(self):
-        return str(self.value) + self.suit[0]
+from minipoker.logic.deck import Card, Suits
+from minipoker.logic import evaluator
 
 
 class InvalidHandException(Exception):
@@ -33,246 +8,105 @@ class InvalidHandException(Exception):
 
 
 class Hand(object):
+    """
+    A five card hand. Hands are views over the integer strength computed by the evaluator,
+    so comparing hands is comparing integers.
+    """
 
     rank = -1
 
-    def __init__(self, cards):
+    def __init__(self, cards, strength=None):
         if len(cards) != 5:
             raise InvalidHandException("Card count was not 5!")
         self.cards = sorted(cards)
-        self.values_counter = Counter([card.value for card in self.cards])
+        self.strength = evaluator.evaluate5(self.cards) if strength is None else strength
 
     def __gt__(self, other):
+        return self.strength > other.strength
 
-        LOGGER.debug("Comparing: %s and %s" % (self, other))
-        if self.rank != other.rank:
-            return self.rank > other.rank
+    def __lt__(self, other):
+        return self.strength < other.strength
 
-        return self.compare_same(other)
-
-    def __get_repeated_card(self, n):
-        """
-        get the n-th most repeated card. No promise is made about order of similarly repeated cards
-        :param n: count rank of card to get (1, 2, 2, 3, 3)[1] -> 2 or 3, (1, 2, 2, 2)[0] -> 2 ...
-        :return: nth most repeated card
-        """
-        return self.values_counter.most_common(5)[n]
-
-    def compare_cards_high_to_low(self, other):
-        card, other_card = None, None
-        for card, other_card in zip(self.cards, other.cards):
-            if card.value != other_card.value:
-                break
+    def __eq__(self, other):
+        return isinstance(other, Hand) and self.strength == other.strength
 
-        return card.value > other_card.value
+    def __hash__(self):
+        return hash(self.strength)
 
     def compare_same(self, other):
-        raise NotImplementedError("Can not compare an abstract hand!")
+        return self.strength > other.strength
 
     @staticmethod
     def get_hand(cards):
-        cards = sorted(cards)
-        classification_candidates = [
-            StraightFlush,
-            FourOfAKind,
-            FullHouse,
-            Flush,
-            Straight,
-            ThreeOfAKind,
-            TwoPairs,
-            Pair,
-        ]
-        for candidate in classification_candidates:
-            if candidate.is_valid(cards):
-                LOGGER.debug("%s: %s" % (candidate.__name__, str(cards)))
-                return candidate(cards)
-
-        # nothing identified, play using highest cards
-        return HighCard(cards)
+        if len(cards) != 5:
+            raise InvalidHandException("Card count was not 5!")
+        strength = evaluator.evaluate5(cards)
+        return HANDS[evaluator.category(strength)](cards, strength)
 
     @staticmethod
-    def is_valid(cards):
-        raise NotImplemented("is_valid not implemented for abstract hand!")
+    def best_hand(cards, strength=None):
+        """
+        :param cards: five to seven cards
+        :param strength: strength of the best hand, when it is already known
+        :return: the best hand that can be made out of cards
+        """
+        strength, five = evaluator.best_five(cards, strength)
+        return HANDS[evaluator.category(strength)](five, strength)
+
+    @classmethod
+    def is_valid(cls, cards):
+        return evaluator.category(evaluator.evaluate5(cards)) == cls.rank
 
     def __repr__(self):
-        return "%s - %s" % (self.__class__, ','.join([str(card.value) + card.suit[0] for card in self.cards]))
+        return "%s - %s" % (self.__class__, ','.join(repr(card) for card in self.cards))
 
     def __str__(self):
         return ", ".join(str(c) for c in self.cards)
 
 
 class StraightFlush(Hand):
-
-    rank = 8
-
-    def __init__(self, cards):
-        super(StraightFlush, self).__init__(cards)
-
-    @staticmethod
-    def is_valid(cards):
-        sf = Flush.is_valid(cards) and Straight.is_valid(cards)
-        return sf
-
-    def compare_same(self, other):
-        return self.compare_cards_high_to_low(other)
+    rank = evaluator.STRAIGHT_FLUSH
 
 
 class FourOfAKind(Hand):
-
-    rank = 7
-
-    def __init__(self, cards):
-        super(FourOfAKind, self).__init__(cards)
-
-    @staticmethod
-    def is_valid(cards):
-        counter = Counter([card.value for card in cards])
-        return max(counter.values()) == 4
-
-    def __repeated_card4(self):
-        return self.values_counter.most_common(1)[0]
-
-    def compare_same(self, other):
-        return self.__repeated_card4() > other.__repeated_card4()
+    rank = evaluator.FOUR_OF_A_KIND
 
 
 class FullHouse(Hand):
-
-    rank = 6
-
-    def __init__(self, cards):
-        super(FullHouse, self).__init__(cards)
-
-    @staticmethod
-    def is_valid(cards):
-        counter = Counter([card.value for card in cards])
-        return 2 in counter.values() and 3 in counter.values()
-
-    def __repeated_card3(self):
-        return self.values_counter.most_common(1)[0]
-
-    def compare_same(self, other):
-        return self.__repeated_card3() > other.__repeated_card3()
+    rank = evaluator.FULL_HOUSE
 
 
 class Flush(Hand):
-
-    rank = 5
-
-    def __init__(self, cards):
-        super(Flush, self).__init__(cards)
-
-    @staticmethod
-    def is_valid(cards):
-        f = all(card.suit == cards[0].suit for card in cards)
-        if f:
-            LOGGER.debug("found flush!")
-        return f
-
-    def compare_same(self, other):
-        return self.compare_cards_high_to_low(other)
+    rank = evaluator.FLUSH
 
 
 class Straight(Hand):
-
-    rank = 4
-
-    def __init__(self, cards):
-        super(Straight, self).__init__(cards)
-
-    @staticmethod
-    def is_valid(cards):
-        return all(card.value == v for card, v in zip(cards, range(cards[0].value, cards[0].value + 5)))
-
-    def compare_same(self, other):
-        self.compare_cards_high_to_low(other)
+    rank = evaluator.STRAIGHT
 
 
 class ThreeOfAKind(Hand):
-
-    rank = 3
-
-    def __init__(self, cards):
-        super(ThreeOfAKind, self).__init__(cards)
-
-    @staticmethod
-    def is_valid(cards):
-        counter = Counter([card.value for card in cards])
-        return max(counter.values()) == 3
-
-    def __repeated_card3(self):
-        return self.values_counter.most_common(1)[0]
-
-    def compare_same(self, other):
-        return self.__repeated_card3() > other.__repeated_card3()
+    rank = evaluator.THREE_OF_A_KIND
 
 
 class TwoPairs(Hand):
-
-    rank = 2
-
-    def __init__(self, cards):
-        super(TwoPairs, self).__init__(cards)
-
-    @staticmethod
-    def is_valid(cards):
-        counter = Counter([card.value for card in cards])
-        return sorted(counter.values())[-2:] == [2, 2]
-
-    def __repeated_cards2_2(self):
-        return self.values_counter.most_common(2)
-
-    def compare_same(self, other):
-        high_pair, low_pair = self.__repeated_cards2_2()
-        other_high_pair, other_low_pair = other.__repeated_cards2_2()
-        if high_pair != other_high_pair:
-            return high_pair > other_high_pair
-        if low_pair != other_low_pair:
-            return low_pair > other_low_pair
-
-        return self.compare_cards_high_to_low
+    rank = evaluator.TWO_PAIRS
 
 
 class Pair(Hand):
-
-    rank = 1
-
-    def __init__(self, cards):
-        super(Pair, self).__init__(cards)
-
-    @staticmethod
-    def is_valid(cards):
-        counter = Counter([card.value for card in cards])
-        return max(counter.values()) == 2
-
-    def __repeated_cards2(self):
-        return self.values_counter.most_common(1)[0]
-
-    def compare_same(self, other):
-        if self.__repeated_cards2() != other.__repeated_cards2():
-            return self.__repeated_cards2() > other.__repeated_cards2()
-
-        return self.compare_cards_high_to_low(other)
+    rank = evaluator.PAIR
 
 
 class HighCard(Hand):
+    rank = evaluator.HIGH_CARD
 
-    rank = 0
-
-    def __init__(self, cards):
-        super(HighCard, self).__init__(cards)
 
-    @staticmethod
-    def is_valid(cards):
-        return
-
-    def compare_same(self, other):
-        return self.compare_cards_high_to_low(other)
+# hand category -> hand class
+HANDS = (HighCard, Pair, TwoPairs, ThreeOfAKind, Straight, Flush, FullHouse, FourOfAKind, StraightFlush)
 
 
 class TestHands(unittest.TestCase):
 
     def test_detection(self):
-        straight_flush = Hand.get_hand([Card(value, 'Hearts') for value in range(5)])
-        straight = Hand.get_hand([Card(value, 'Hearts') for value in range(4)] + [Card(4, 'Clubs')])
+        straight_flush = Hand.get_hand([Card(value, Suits.HEARTS) for value in range(1, 6)])
+        straight = Hand.get_hand([Card(value, Suits.HEARTS) for value in range(1, 5)] + [Card(5, Suits.CLUBS)])
         assert max(straight, straight_flush) == straight_flush
@@ -0,0 +1,129 @@
+"""
+Headless bot-vs-bot simulation.
+
+Games run with the normal rules but without an event queue, without the per round game
+log and with bounded history, and the throughput (rounds, i.e. hands, per second) is
+measured. With --stats, per phase timings and counters (see stats.RoundStats) are
+reported as well. Run python -m minipoker.logic.headless --help for the command line.
+"""
+import argparse
+import json
+import time
+
+from minipoker.logic import trace
+from minipoker.logic.poker import Poker
+from minipoker.logic.players import RandomPlayer
+from minipoker.logic.stats import RoundStats
+
+# rounds kept per game (the last one is still available as current_round)
+HISTORY = 1
+
+
+class Throughput(object):
+    def __init__(self, games=0, hands=0, seconds=0.0):
+        self.games = games
+        self.hands = hands
+        self.seconds = seconds
+
+    @property
+    def hands_per_second(self):
+        return self.hands / self.seconds if self.seconds else 0.0
+
+    def add(self, other):
+        self.games += other.games
+        self.hands += other.hands
+        self.seconds += other.seconds
+
+    def as_dict(self):
+        return {
+            'games': self.games,
+            'hands': self.hands,
+            'seconds': self.seconds,
+            'hands_per_second': self.hands_per_second,
+        }
+
+    def __str__(self):
+        return "%d games, %d hands in %.2fs (%.1f hands/s)" % (
+            self.games, self.hands, self.seconds, self.hands_per_second)
+
+
+def make_game(players, history=HISTORY, rng=None, stats=None, action_timeout=None):
+    return Poker(players, headless=True, history=history, game_log=False, rng=rng, stats=stats,
+                 action_timeout=action_timeout)
+
+
+def play_game(players, history=HISTORY, rng=None, stats=None, action_timeout=None):
+    """
+    :param players: players of the game
+    :param rng: random generator of the game (see Poker)
+    :param stats: stats of the game's rounds (see Poker)
+    :param action_timeout: seconds per action (see Poker)
+    :return: (winner, Throughput of the game)
+    """
+    game = make_game(players, history, rng, stats, action_timeout)
+    start = time.perf_counter()
+    winner = game.play()
+    return winner, Throughput(1, game.round_count, time.perf_counter() - start)
+
+
+def simulate(make_players, games, stats=None, action_timeout=None):
+    """
+    :param make_players: function returning a fresh list of players for a game
+    :param games: number of games to play
+    :param stats: stats shared by all the games' rounds (see Poker)
+    :param action_timeout: seconds per action (see Poker)
+    :return: (wins per player name, Throughput)
+    """
+    wins = {}
+    throughput = Throughput()
+    for _ in range(games):
+        winner, game_throughput = play_game(make_players(), stats=stats, action_timeout=action_timeout)
+        wins[winner.name] = wins.get(winner.name, 0) + 1
+        throughput.add(game_throughput)
+    return wins, throughput
+
+
+def player_types():
+    types = {'random': RandomPlayer}
+    try:
+        from minipoker.logic.ai.aiplayers import SimpleAIPlayer
+        types['simple-ai'] = SimpleAIPlayer
+    except ImportError:
+        pass
+    return types
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="Play headless games and report the throughput")
+    parser.add_argument('players', nargs='+', help="player types: %s" % ', '.join(sorted(player_types())))
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--money', type=int, default=100)
+    parser.add_argument('--output', help="append the result as a JSON line to this file")
+    parser.add_argument('--stats', type=int, metavar='HANDS', nargs='?', const=0,
+                        help="measure the phases of the rounds, and report them every HANDS hands")
+    parser.add_argument('--json-stats', action='store_true', help="report the stats as JSON lines")
+    parser.add_argument('--action-timeout', type=float, metavar='SECONDS',
+                        help="seconds per action, late players check or fold")
+    parser.add_argument('--trace', metavar='FILE', help="write trace events to this file (JSON lines)")
+    parser.add_argument('--trace-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING'])
+    parser.add_argument('--trace-sample', type=float, default=1.0, help="fraction of the per action events traced")
+    arguments = parser.parse_args()
+    # simulations discard the trace unless asked for it
+    trace.configure(arguments.trace, getattr(trace, arguments.trace_level), arguments.trace_sample)
+    types = player_types()
+    stats = None
+    if arguments.stats is not None:
+        stats = RoundStats(arguments.stats, lambda stats_: print(stats_.to_json() if arguments.json_stats else stats_))
+    wins, throughput = simulate(
+        lambda: [types[name]("%s-%d" % (name, seat), arguments.money) for seat, name in enumerate(arguments.players)],
+        arguments.games, stats, arguments.action_timeout)
+    print(throughput)
+    print(json.dumps(wins, sort_keys=True))
+    if stats is not None:
+        stats.report(stats)
+    if arguments.output:
+        with open(arguments.output, 'a') as output:
+            result = dict(throughput.as_dict(), wins=wins)
+            if stats is not None:
+                result['stats'] = stats.snapshot()
+            output.write(json.dumps(result, sort_keys=True) + "\n")
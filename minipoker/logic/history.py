@@ -0,0 +1,260 @@
+"""
+Compact binary hand history.
+
+A history file is a header followed by a stream of records. Every record starts with a
+one byte type, followed by a fixed layout for that type (all little endian):
+
+    header      4s magic b'MPHH', uint16 version
+
+    PLAYER      uint32 player id, uint8 name length, name (utf-8)
+                written the first time a player shows up
+    HAND        uint32 hand number, uint8 seats, uint8 button seat, uint32 small blind
+    SEAT        uint8 seat, uint32 player id, uint32 money before the blinds
+                one per seat, right after HAND
+    POCKET      uint8 seat, uint8 card, uint8 card
+    BLIND       uint8 seat, uint32 amount
+    ACTION      uint8 seat, uint8 action (see ACTIONS), uint32 amount (0 for fold / check)
+    BOARD       uint8 card
+    PAYOUT      uint8 seat, uint32 amount
+    END         (no fields) end of the hand
+
+Cards are stored as their index (Card.index, 0 - 51). A typical hand takes under 100 bytes.
+
+HistoryWriter streams records to a file and can be given to Poker as its recorder.
+HistoryReader memory maps a file and iterates its records or hands without loading it.
+"""
+import mmap
+import struct
+
+from minipoker.logic.deck import Card
+
+MAGIC = b'MPHH'
+VERSION = 1
+HEADER = struct.Struct('<4sH')
+
+PLAYER, HAND, SEAT, POCKET, BLIND, ACTION, BOARD, PAYOUT, END = range(1, 10)
+
+LAYOUTS = {
+    PLAYER: struct.Struct('<BIB'),
+    HAND: struct.Struct('<BIBBI'),
+    SEAT: struct.Struct('<BBII'),
+    POCKET: struct.Struct('<BBBB'),
+    BLIND: struct.Struct('<BBI'),
+    ACTION: struct.Struct('<BBBI'),
+    BOARD: struct.Struct('<BB'),
+    PAYOUT: struct.Struct('<BBI'),
+    END: struct.Struct('<B'),
+}
+
+# action codes, by Action.name
+ACTIONS = ('Fold', 'Check', 'Call', 'Bet')
+_ACTION_CODES = {name: code for code, name in enumerate(ACTIONS)}
+
+
+class InvalidHistoryException(Exception):
+    pass
+
+
+class NullRecorder(object):
+    """
+    recorder of games nobody records: every hook does nothing
+    """
+
+    def start_hand(self, number, round_):
+        pass
+
+    def pocket(self, seat, cards):
+        pass
+
+    def blind(self, seat, amount):
+        pass
+
+    def action(self, seat, action):
+        pass
+
+    def board(self, card):
+        pass
+
+    def payout(self, seat, amount):
+        pass
+
+    def end_hand(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class HistoryWriter(NullRecorder):
+    def __init__(self, path, buffer_size=1 << 16):
+        self.file = open(path, 'wb', buffering=buffer_size)
+        self.file.write(HEADER.pack(MAGIC, VERSION))
+        self.known_players = set()
+
+    def start_hand(self, number, round_):
+        write = self.file.write
+        for player in round_.players:
+            if player.id not in self.known_players:
+                self.known_players.add(player.id)
+                name = player.name.encode('utf-8')[:255]
+                write(LAYOUTS[PLAYER].pack(PLAYER, player.id, len(name)) + name)
+        write(LAYOUTS[HAND].pack(HAND, number, len(round_.players), round_.seat(round_.button_player),
+                                 round_.small_blind))
+        for seat, player in enumerate(round_.players):
+            write(LAYOUTS[SEAT].pack(SEAT, seat, player.id, player.money))
+
+    def pocket(self, seat, cards):
+        self.file.write(LAYOUTS[POCKET].pack(POCKET, seat, cards[0].index, cards[1].index))
+
+    def blind(self, seat, amount):
+        self.file.write(LAYOUTS[BLIND].pack(BLIND, seat, amount))
+
+    def action(self, seat, action):
+        self.file.write(LAYOUTS[ACTION].pack(ACTION, seat, _ACTION_CODES[action.name], getattr(action, 'amount', 0)))
+
+    def board(self, card):
+        self.file.write(LAYOUTS[BOARD].pack(BOARD, card.index))
+
+    def payout(self, seat, amount):
+        self.file.write(LAYOUTS[PAYOUT].pack(PAYOUT, seat, amount))
+
+    def end_hand(self):
+        self.file.write(LAYOUTS[END].pack(END))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class HandRecord(object):
+    """
+    one recorded hand
+    """
+
+    def __init__(self, number, button, small_blind):
+        self.number = number
+        self.button = button
+        self.small_blind = small_blind
+        # per seat: (player id, money before the blinds)
+        self.seats = []
+        # seat -> pocket cards
+        self.pockets = {}
+        # (seat, amount) in order
+        self.blinds = []
+        # (seat, action name, amount) in order
+        self.actions = []
+        self.board = []
+        # seat -> amount won
+        self.payouts = {}
+
+    def folded(self):
+        return {seat for seat, action, _ in self.actions if action == 'Fold'}
+
+    def contributions(self):
+        """
+        :return: seat -> total money put in the pot
+        """
+        totals = dict.fromkeys(range(len(self.seats)), 0)
+        for seat, amount in self.blinds:
+            totals[seat] += amount
+        for seat, _, amount in self.actions:
+            totals[seat] += amount
+        return totals
+
+
+class HistoryReader(object):
+    def __init__(self, path):
+        with open(path, 'rb') as history_file:
+            self.data = mmap.mmap(history_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size:
+            raise InvalidHistoryException("Not a hand history: %s" % path)
+        magic, self.version = HEADER.unpack_from(self.data)
+        if magic != MAGIC or self.version != VERSION:
+            raise InvalidHistoryException("Not a hand history (or unsupported version): %s" % path)
+        # player id -> name
+        self.names = {}
+
+    def batches(self, hands_per_batch):
+        """
+        split the file at hand boundaries, without decoding the records
+        :return: list of (start offset, end offset), each holding up to hands_per_batch hands
+        """
+        data, offset, end = self.data, HEADER.size, len(self.data)
+        sizes = {record_type: layout.size for record_type, layout in LAYOUTS.items()}
+        boundaries = [offset]
+        hands = 0
+        while offset < end:
+            record_type = data[offset]
+            if record_type not in sizes:
+                raise InvalidHistoryException("Unknown record type %d at offset %d" % (record_type, offset))
+            offset += sizes[record_type]
+            if record_type == PLAYER:
+                offset += data[offset - 1]
+            elif record_type == END:
+                hands += 1
+                if hands % hands_per_batch == 0:
+                    boundaries.append(offset)
+        if boundaries[-1] != end:
+            boundaries.append(end)
+        return list(zip(boundaries, boundaries[1:]))
+
+    def records(self, start=None, end=None):
+        """
+        :param start: offset of the first record (defaults to the first record of the file)
+        :param end: offset to stop at (defaults to the end of the file)
+        :return: generator of (record type, fields), PLAYER fields are (player id, name)
+        """
+        data = self.data
+        offset = HEADER.size if start is None else start
+        end = len(data) if end is None else end
+        while offset < end:
+            record_type = data[offset]
+            try:
+                layout = LAYOUTS[record_type]
+            except KeyError:
+                raise InvalidHistoryException("Unknown record type %d at offset %d" % (record_type, offset))
+            if offset + layout.size > end:
+                raise InvalidHistoryException("Truncated record at offset %d" % offset)
+            fields = layout.unpack_from(data, offset)[1:]
+            offset += layout.size
+            if record_type == PLAYER:
+                player_id, length = fields
+                fields = (player_id, bytes(data[offset:offset + length]).decode('utf-8'))
+                offset += length
+            yield record_type, fields
+
+    def hands(self, start=None, end=None):
+        """
+        :param start: offset of a hand (see batches), defaults to the first hand
+        :param end: offset to stop at, defaults to the end of the file
+        :return: generator of HandRecord (player names are collected in self.names on the way)
+        """
+        hand = None
+        for record_type, fields in self.records(start, end):
+            if record_type == PLAYER:
+                self.names[fields[0]] = fields[1]
+            elif record_type == HAND:
+                hand = HandRecord(fields[0], fields[2], fields[3])
+            elif record_type == SEAT:
+                hand.seats.append(fields[1:])
+            elif record_type == POCKET:
+                hand.pockets[fields[0]] = (Card.from_index(fields[1]), Card.from_index(fields[2]))
+            elif record_type == BLIND:
+                hand.blinds.append(fields)
+            elif record_type == ACTION:
+                hand.actions.append((fields[0], ACTIONS[fields[1]], fields[2]))
+            elif record_type == BOARD:
+                hand.board.append(Card.from_index(fields[0]))
+            elif record_type == PAYOUT:
+                hand.payouts[fields[0]] = hand.payouts.get(fields[0], 0) + fields[1]
+            elif record_type == END:
+                yield hand
+                hand = None
+
+    def close(self):
+        self.data.close()
@@ -1,12 +1,11 @@
 from itertools import combinations
 import os
-import logging
 from minipoker.logic.hands import Hand
+from minipoker.logic import trace
 import random
 
 
-LOGGER = logging.getLogger('poker-players')
-LOGGER.setLevel(logging.WARN)
+TRACE = trace.tracer('poker-players')
 
 
 class Action(object):
@@ -19,6 +18,13 @@ class Action(object):
     def is_valid(player, round_):
         raise NotImplementedError("Can not validate abstract Action")
 
+    def is_current(self, round_):
+        """
+        :return: whether the action can be applied now: it was made in the round, by its betting
+                 player, and is still valid (e.g. not an answer to an earlier street)
+        """
+        return self.round is round_ and self.player is round_.betting_player and self.is_valid(self.player, round_)
+
     def apply(self):
         raise NotImplementedError("Can not apply abstract Action")
 
@@ -43,10 +49,10 @@ class Fold(Action):
 
     @staticmethod
     def is_valid(player, round_):
-        return player not in round_.folded_players
+        return not round_.is_folded(player)
 
     def apply(self):
-        self.round.folded_players.append(self.player)
+        self.round.fold(self.player)
 
     def __str__(self):
         return "Player %s folds" % self.player
@@ -79,6 +85,9 @@ class Call(AmountableAction):
     def is_valid(player, round_):
         return player.money >= round_.pot.amount_to_call(player) > 0
 
+    def is_current(self, round_):
+        return super(Call, self).is_current(round_) and self.amount == round_.pot.amount_to_call(self.player)
+
     def apply(self):
         self.player.bet(self.amount, self.round)
 
@@ -93,14 +102,13 @@ class Bet(AmountableAction):
     def __init__(self, player, round_, amount=None):
         # TODO: change bet_max to actual max with respect to round
         bet_min, bet_max = round_.pot.minimum_to_bet(player), player.money
-        LOGGER.debug("Setting bet limits to %d-%d" % (bet_min, bet_max))
         # choose action amount (example: bet, 50)
         while (amount is None) or (bet_min > amount or amount > bet_max):
             try:
                 amount = int(player.get_amount(bet_min, bet_max))
             except ValueError:
-                print("Value has to be between 0 and ")
-        LOGGER.debug("Player %s bet: %d" % (player.name, amount))
+                TRACE.warning('invalid_amount', player=player.name, minimum=bet_min, maximum=bet_max)
+        TRACE.debug('bet_amount', player=player.name, amount=amount, minimum=bet_min, maximum=bet_max)
 
         super(Bet, self).__init__(player, round_, amount)
 
@@ -108,6 +116,10 @@ class Bet(AmountableAction):
     def is_valid(player, round_):
         return player.money >= round_.pot.minimum_to_bet(player) > 0
 
+    def is_current(self, round_):
+        return super(Bet, self).is_current(round_) and \
+            round_.pot.minimum_to_bet(self.player) <= self.amount <= self.player.money
+
     def apply(self):
         self.player.money -= self.amount
         self.round.bet(self.player, self.amount)
@@ -116,6 +128,13 @@ class Bet(AmountableAction):
         return "Player %s bets %d" % (self.player.name, self.amount)
 
 
+def passive_action(player, round_):
+    """
+    :return: the action of a player who does not answer in time: check if possible, fold otherwise
+    """
+    return Check(player, round_) if Check.is_valid(player, round_) else Fold(player, round_)
+
+
 class NotEnoughMoneyException(Exception):
     pass
 
@@ -124,13 +143,16 @@ class BasePlayer(object):
 
     ids = 0
 
-    def __init__(self, name, starting_money):
+    def __init__(self, name, starting_money, rng=None):
+        """
+        :param rng: random generator for the player's decisions (defaults to the random module)
+        """
+        self.rng = rng or random
         self.id = BasePlayer.ids
         BasePlayer.ids += 1
         self.name = name
         self.pocket = None
         self.money = starting_money
-        self.first_bet = False
         self.checked = False
 
     def on_game_ended(self, game):
@@ -157,12 +179,16 @@ class BasePlayer(object):
         :return:
                 amount of money actually taken
         """
-        LOGGER.info("Forcing %s to bet %d" % (self.name, amount))
+        TRACE.debug('forced_bet', player=self.name, amount=amount)
         amount = min(amount, self.money)
         self.bet(amount, round_)
         return amount
 
     def interact(self, _game):
+        """
+        :return: the player's Action, or None to give up the decision (e.g. when out of time,
+                 see time_left), which checks if possible and folds otherwise
+        """
         raise NotImplementedError("Interact is not implemented on the Player's base class")
 
     def get_amount(self, _min, _max):
@@ -172,8 +198,13 @@ class BasePlayer(object):
         return round_.is_folded(self)
 
     def is_betting(self, round_):
-        return len(round_.active_players) > 1 and self.money > 0 and self.first_bet or (
-            not self.is_folded(round_) and round_.pot.amount_to_call(self) > 0)
+        return round_.is_betting(self)
+
+    def time_left(self, round_):
+        """
+        :return: seconds left to act (None when actions have no deadline)
+        """
+        return round_.time_left()
 
     @staticmethod
     def generate_possible_hands(pocket, community_cards):
@@ -184,18 +215,11 @@ class BasePlayer(object):
 
     def best_hand(self, community_cards):
         # TODO: add aces multiple value (1, 14)
-        # print("Community Cards: %s" % community_cards)
-        # print("Pocket cards: %s" % self.pocket)
-        # print("possible hands:\n%s" % '\n'.join(map(str, self.possible_hands(community_cards))))
-        best_hand = max(self.possible_hands(community_cards))
-        return best_hand
+        return Hand.best_hand(self.pocket + community_cards)
 
     def available_actions(self, _round):
-        LOGGER.debug("fetching available moves")
         if not _round:
-            LOGGER.debug("0 moves for false round")
             return []
-        LOGGER.debug("round is ok, fetching moves")
         return list(filter(lambda x: x.is_valid(self, _round), [Check, Call, Bet, Fold]))
 
     def choose_action_message(self, round_):
@@ -235,8 +259,8 @@ class RandomPlayer(BasePlayer):
 
     def interact(self, _game):
         round_ = _game.current_round
-        return random.choice(self.available_actions(round_))(self, round_)
+        return self.rng.choice(self.available_actions(round_))(self, round_)
 
     def get_amount(self, _min, _max):
-        return random.randint(_min, _max)
+        return self.rng.randint(_min, _max)
 
@@ -1,10 +1,17 @@
-from random import choice
-from collections import defaultdict
-import logging
+import random
+import time
+from collections import defaultdict, deque
 from minipoker.logic.deck import Deck
+from minipoker.logic.hands import Hand
+from minipoker.logic import evaluator, sidepots
+from minipoker.logic.history import NullRecorder
+from minipoker.logic.players import passive_action
+from minipoker.logic.seats import SeatTable
+from minipoker.logic import stats as roundstats
+from minipoker.logic import trace
 import queue
 
-LOGGER = logging.getLogger('poker-main')
+TRACE = trace.tracer('poker-main')
 
 
 class Events:
@@ -15,14 +22,35 @@ class Events:
     PLAYER_BET = "Player bet"
 
 
+class NullEventQueue(object):
+    """
+    event queue for games nobody watches (no GUI): events are dropped
+    """
+
+    def put(self, event):
+        pass
+
+
+def drive(steps, game):
+    """
+    run a game or a round synchronously (see Poker.steps), each player acting through
+    Player.interact
+    :return: the value of the steps
+    """
+    try:
+        player = next(steps)
+        while True:
+            player = steps.send(player.interact(game))
+    except StopIteration as done:
+        return done.value
+
+
 class Pot(object):
     def __init__(self, small_blind):
         self.bets = defaultdict(int)
         self.last_raise = small_blind * 2
-
-    @property
-    def current_bet(self):
-        return max(self.bets.values())
+        # the highest bet so far (bets only grow)
+        self.current_bet = 0
 
     def player_bet(self, player):
         return self.bets[player]
@@ -31,28 +59,69 @@ class Pot(object):
         return self.current_bet - self.bets[player]
 
     def minimum_to_bet(self, player):
-        LOGGER.debug("current bet: %d, last raise: %d, player_bet: %d" % (
-            self.current_bet, self.last_raise, self.player_bet(player)
-        ))
+        if TRACE.enabled(trace.DEBUG):
+            TRACE.debug('minimum_to_bet', current_bet=self.current_bet, last_raise=self.last_raise,
+                        player_bet=self.player_bet(player))
         return max(1, self.amount_to_call(player) + self.last_raise)
 
-    def take_pot_for_player(self, player):
-        player_bet = self.player_bet(player)
-
-        winnings = 0
-        # take amount from all bets
-        for player, bet in self.bets.items():
-            # see how much is possible to take from player
-            possible_to_take = min(bet, player_bet)
-            winnings += possible_to_take
-            # remove as much as possible from player
-            self.bets[player] -= possible_to_take
-
-        return winnings
+    def payouts(self, strengths, order=None):
+        """
+        pay the pot out to the players left at showdown (see sidepots)
+        :param strengths: player -> strength of the player's best hand, in seat order
+        :param order: players in odd chip order, defaults to the order of strengths
+        :return: list of (player, winnings), players left best hand first, then any folded
+                 player getting uncalled chips back
+        """
+        won = sidepots.settle(self.bets, strengths, order)
+        payouts = [(player, won.pop(player, 0)) for player in sorted(strengths, key=strengths.get, reverse=True)]
+        payouts.extend(won.items())
+        return payouts
 
     def bet(self, player, amount):
-        LOGGER.info("%s bets %d" % (player, amount))
+        TRACE.sampled('bet', player=player, amount=amount)
         self.bets[player] += amount
+        if self.bets[player] > self.current_bet:
+            self.current_bet = self.bets[player]
+
+
+class Showdown(object):
+    """
+    hands of the players left at the end of a round, evaluated once
+    """
+
+    def __init__(self, hand_states):
+        """
+        :param hand_states: player -> evaluator.HandState, for the players left in seat order
+        """
+        self.hand_states = hand_states
+        # player -> strength of the player's best hand, in seat order
+        self.strengths = {player: state.strength for player, state in hand_states.items()}
+        # players, best hand first (seat order between equal hands)
+        self.ranking = sorted(self.strengths, key=self.strengths.get, reverse=True)
+        # lists of players with equal hands, best hands first
+        self.tie_groups = []
+        previous = None
+        for player in self.ranking:
+            if self.strengths[player] != previous:
+                self.tie_groups.append([])
+                previous = self.strengths[player]
+            self.tie_groups[-1].append(player)
+        self.hands = {}
+
+    def rank(self, player):
+        """
+        :return: position of the player's tie group (0 for the best hands)
+        """
+        strength = self.strengths[player]
+        return next(index for index, group in enumerate(self.tie_groups) if self.strengths[group[0]] == strength)
+
+    def hand(self, player):
+        """
+        :return: the player's best hand (its five cards are only looked up once)
+        """
+        if player not in self.hands:
+            self.hands[player] = Hand.best_hand(self.hand_states[player].cards, self.strengths[player])
+        return self.hands[player]
 
 
 class Round(object):
@@ -60,37 +129,98 @@ class Round(object):
         self.game = game
         self.event_queue = event_queue
         self.players = players[:]
-        self.folded_players = []
+        # folded, all in and acted flags and the seating ring (see seats)
+        self.seat_table = SeatTable(self.players)
+        self._active_players = None
         self.small_blind = small_blind
         self.betting_player = None
         self.pot = None
-        self.deck = Deck()
+        # the game's deck is reused from round to round
+        self.deck = game.deck
+        self.deck.reset()
         self.community_cards = []
         self.button_player = button_player
         self.pot = Pot(self.small_blind)
         self.action_log = []
-        LOGGER.info("Dealing cards")
+        self.seats = self.seat_table.seats
+        self.recorder = game.recorder
+        self.stats = game.stats
+        # seconds each player has per action, and the time.monotonic() the betting player's runs out
+        self.action_timeout = game.action_timeout
+        self.deadline = None
+        start = self.stats.clock()
+        self.recorder.start_hand(game.round_count + 1, self)
+        TRACE.debug('dealing', players=len(self.players))
+        # player -> evaluator.HandState of the player's pocket and the open community cards
+        self.hand_states = {}
+        self._showdown = None
         for player in self.players:
             player.set_pocket(self.deck.draw_single(), self.deck.draw_single())
+            self.hand_states[player] = evaluator.HandState(player.pocket)
+            self.recorder.pocket(self.seats[player], player.pocket)
+        self.stats.phase(roundstats.DEALING, start)
 
     def bet(self, player, amount):
         self.event_queue.put(Events.PLAYER_BET)
-        self.pot.bet(player, amount)
+        pot = self.pot
+        current_bet = pot.current_bet
+        pot.bet(player, amount)
+        seat = self.seats[player]
+        if pot.bets[player] > current_bet:
+            self.seat_table.raised(seat)
+        elif pot.bets[player] == current_bet:
+            self.seat_table.matched(seat)
+        if player.money == 0:
+            self.seat_table.go_all_in(seat)
+
+    def fold(self, player):
+        self.seat_table.fold(self.seats[player])
+        self._active_players = None
+
+    def seat(self, player):
+        return self.seats[player]
+
+    def hand_state(self, player):
+        """
+        :return: evaluator.HandState of the player's pocket and the open community cards
+        """
+        return self.hand_states[player]
 
     def is_folded(self, player):
-        return player in self.folded_players
+        return self.seat_table.is_folded(self.seats[player])
+
+    def is_betting(self, player):
+        """
+        :return: whether the player still has to act in the current betting street
+        """
+        return self.seat_table.is_pending(self.seats[player])
+
+    def time_left(self):
+        """
+        :return: seconds the betting player has left to act (None when actions have no deadline)
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    @property
+    def folded_players(self):
+        return [player for player in self.players if self.is_folded(player)]
 
     @property
     def active_players(self):
-        return [player for player in self.players if player not in self.folded_players]
+        # only changes when somebody folds
+        if self._active_players is None:
+            self._active_players = [self.players[seat] for seat in self.seat_table.active_seats()]
+        return self._active_players
 
     def after(self, player):
-        index = self.players.index(player)
-        return self.players[(index + 1) % len(self.players)]
+        return self.players[self.seat_table.ring[self.seats[player]]]
 
     def take_blinds(self):
-        self.small_blind_player().force_bet(self.small_blind, self)
-        self.big_blind_player().force_bet(2 * self.small_blind, self)
+        for player, blind in ((self.small_blind_player(), self.small_blind),
+                              (self.big_blind_player(), 2 * self.small_blind)):
+            self.recorder.blind(self.seats[player], player.force_bet(blind, self))
         return self.betting_player
 
     def small_blind_player(self):
@@ -101,93 +231,125 @@ class Round(object):
 
     def winner(self):
         # check if only a single player is left
-        return self.players[0] if len(self.players) - len(self.folded_players) == 1 else None
+        seat = self.seat_table.single_active()
+        return None if seat is None else self.players[seat]
+
+    # the betting streets (and place_bets) are steps: generators yielding each player to act
+    # and receiving the player's action, see Poker.steps
 
     def pre_flop_betting(self):
         if self.winner() is not None:
             return
         self.betting_player = self.after(self.big_blind_player())
-        self.place_bets()
+        yield from self.place_bets()
 
     def pre_turn_betting(self):
         if self.winner() is not None:
             return
         self.betting_player = self.after(self.button_player)
-        self.place_bets()
+        yield from self.place_bets()
 
     def pre_river_betting(self):
         if self.winner() is not None:
             return
         self.betting_player = self.after(self.button_player)
-        self.place_bets()
+        yield from self.place_bets()
 
     def final_betting(self):
         if self.winner() is not None:
             return
         self.betting_player = self.after(self.button_player)
-        self.place_bets()
-
-    def next_betting_player(self):
-        start = self.betting_player
-        candidate = self.after(start)
-        while candidate is not start:
-            if candidate.is_betting(self):
-                LOGGER.info("Found betting player %s" % candidate)
-                return candidate
-            LOGGER.info("Skipping player %s" % candidate)
-            candidate = self.after(candidate)
-        return None
+        yield from self.place_bets()
+
+    def next_betting_player(self, inclusive=False):
+        """
+        :param inclusive: whether the current betting player may be the next one
+        :return: the next player clockwise who still has to act, None when the street is over
+        """
+        seat = self.seat_table.next_pending(self.seats[self.betting_player], inclusive)
+        return None if seat is None else self.players[seat]
 
     def place_bets(self):
         # when no betting players are left
         # self.betting_player will be set to None
 
-        # set player first_bet to True to indicate this player is yet to bet
-        for player in self.active_players:
-            player.first_bet = True
-
-        if not self.betting_player.is_betting(self):
-            LOGGER.info("Skipping player: %s" % str(self.betting_player))
-            self.betting_player = self.next_betting_player()
+        # every player left is yet to act in this street
+        self.seat_table.new_street()
+        self.betting_player = self.next_betting_player(inclusive=True)
 
         while self.betting_player is not None:
-            LOGGER.info("player %s is choosing an action", self.betting_player.name)
-            self.betting_player.first_bet = False
+            self.seat_table.act(self.seats[self.betting_player])
             self.event_queue.put(Events.PLAYER_BETTING)
-            action = self.betting_player.interact(self.game)
-            LOGGER.info("%s chose Action: %s" % (self.betting_player.name, action.__class__.__name__))
+            start = self.stats.clock()
+            if self.action_timeout is not None:
+                self.deadline = time.monotonic() + self.action_timeout
+            action = yield self.betting_player
+            self.stats.decision(self.betting_player, start)
+            if action is None or (self.deadline is not None and time.monotonic() > self.deadline) or \
+                    not action.is_current(self):
+                # no answer, a late one or a stale one (e.g. made for an earlier street): the player
+                # checks or folds
+                TRACE.warning('action_timeout', player=self.betting_player.name, answered=action is not None)
+                self.stats.count(roundstats.TIMEOUTS)
+                action = passive_action(self.betting_player, self)
+            self.deadline = None
+            TRACE.sampled('action', player=self.betting_player.name, action=action.name,
+                          amount=getattr(action, 'amount', 0))
             self.action_log.append(action)
             action.apply()
+            self.recorder.action(self.seats[action.player], action)
             self.betting_player = self.next_betting_player()
 
-        LOGGER.info("Done betting for pre_flop_round")
+        TRACE.debug('betting_done', community_cards=len(self.community_cards))
 
     def play(self):
+        """
+        :return: player -> chips won
+        """
+        return drive(self.steps(), self.game)
 
-        LOGGER.info("Playing another round of poker")
+    def steps(self):
+        """
+        the round, as a generator yielding each player to act and receiving the player's action
+        :return: player -> chips won
+        """
+        stats = self.stats
+        start = stats.clock()
 
         self.take_blinds()
+        start = stats.phase(roundstats.BLINDS, start)
 
-        LOGGER.info("Playing first round (pre-flop)")
-        self.pre_flop_betting()
+        yield from self.pre_flop_betting()
+        start = stats.phase(roundstats.PREFLOP, start)
         self.open_flop_cards()
+        start = stats.phase(roundstats.DEALING, start)
 
-        LOGGER.info("Playing first round (pre-turn)")
-        self.pre_turn_betting()
+        yield from self.pre_turn_betting()
+        start = stats.phase(roundstats.FLOP, start)
         self.open_turn_cards()
+        start = stats.phase(roundstats.DEALING, start)
 
-        LOGGER.info("Playing first round (pre-river)")
-        self.pre_river_betting()
+        yield from self.pre_river_betting()
+        start = stats.phase(roundstats.TURN, start)
         self.open_river_cards()
-        self.final_betting()
-        LOGGER.info("Round winners:")
-        for winner_ in self.get_round_winners():
-            LOGGER.info("%s" % winner_)
-        return dict(self.finish_round())
+        start = stats.phase(roundstats.DEALING, start)
+        yield from self.final_betting()
+        start = stats.phase(roundstats.RIVER, start)
+        if TRACE.enabled(trace.DEBUG):
+            TRACE.debug('round_winners', players=[str(winner_) for winner_ in self.get_round_winners()])
+        winnings = dict(self.finish_round())
+        stats.phase(roundstats.SHOWDOWN, start)
+        self.recorder.end_hand()
+        stats.end_hand()
+        return winnings
 
     def open_card(self):
         self.event_queue.put(Events.CARD_OPENED)
-        self.community_cards.append(self.deck.draw_single())
+        card = self.deck.draw_single()
+        self.community_cards.append(card)
+        for state in self.hand_states.values():
+            state.add(card)
+        self.recorder.board(card)
 
     def open_flop_cards(self):
         self.open_card()
@@ -200,23 +362,60 @@ class Round(object):
     def open_river_cards(self):
         self.open_card()
 
+    def showdown(self):
+        """
+        :return: Showdown of the players left, evaluated the first time it is asked for
+                 (once the betting is over)
+        """
+        if self._showdown is None:
+            active_players = self.active_players
+            self.stats.count(roundstats.HANDS_EVALUATED, len(active_players))
+            self._showdown = Showdown({player: self.hand_states[player] for player in active_players})
+        return self._showdown
+
+    def showdown_strengths(self):
+        """
+        :return: player -> strength of the player's best hand, for players left in seat order
+        """
+        return self.showdown().strengths
+
     def finish_round(self):
         self.event_queue.put(Events.ROUND_FINISHED)
-        for winner_ in self.get_round_winners():
-            winnings = self.pot.take_pot_for_player(winner_)
-            LOGGER.info("Giving winnings (%d) to player: %s [%s]" % (
-                winnings, winner_.name, winner_.best_hand(self.community_cards)))
+        showdown = self.showdown()
+        button = self.seats[self.button_player]
+        # odd chips go to the winners closest to the button's left
+        order = self.players[button + 1:] + self.players[:button + 1]
+        for winner_, winnings in self.pot.payouts(showdown.strengths, order):
+            if TRACE.enabled(trace.INFO):
+                TRACE.info('payout', player=winner_.name, winnings=winnings,
+                           hand=showdown.hand(winner_) if winner_ in showdown.strengths else None)
             winner_.money += winnings
+            self.recorder.payout(self.seats[winner_], winnings)
             yield winner_, winnings
 
     def get_round_winners(self):
-        return sorted(
-            set(self.players) - set(self.folded_players), key=lambda x: x.best_hand(self.community_cards), reverse=True
-        )
+        return self.showdown().ranking
 
 
 class Poker(object):
-    def __init__(self, players):
+    def __init__(self, players, headless=False, history=None, game_log=True, rng=None, recorder=None,
+                 stats=None, action_timeout=None):
+        """
+        :param players: players sitting at the table
+        :param headless: play without an event queue (nobody is watching)
+        :param history: how many rounds and log lines to keep (None keeps everything)
+        :param game_log: whether to record a log line per round winner in self.log
+        :param rng: random generator for the seating and the shuffles (defaults to the random module)
+        :param recorder: hand history recorder (e.g. history.HistoryWriter), nothing is recorded by default
+        :param stats: per phase timing and counters of the rounds (e.g. stats.RoundStats), nothing is measured by default
+        :param action_timeout: seconds a player has per action (see Round.time_left), a player who does not
+                               answer in time checks if possible and folds otherwise (None waits forever)
+        """
+        self.recorder = recorder or NullRecorder()
+        self.stats = stats or roundstats.NULL_STATS
+        self.action_timeout = action_timeout
+        self.rng = rng or random
+        self.deck = Deck(self.rng)
 
         # list of players who ran out of money
         self.finished_players = []
@@ -224,12 +423,14 @@ class Poker(object):
         # list of all players in game
         self.players = players
 
-        self.button_player = choice(self.players)
+        self.button_player = self.rng.choice(self.players)
         self.small_blind = 1
-        self.rounds = []
-        self.log = ["STARTING GAME..."]
+        self.rounds = deque(maxlen=history)
+        self.round_count = 0
+        self.game_log = game_log
+        self.log = deque(["STARTING GAME..."], maxlen=history)
         self.current_round = None
-        self.event_queue = queue.Queue()
+        self.event_queue = NullEventQueue() if headless else queue.Queue()
 
     def winner(self):
         """
@@ -248,29 +449,46 @@ class Poker(object):
             self.button_player = self.after(self.button_player)
 
     def play(self):
-        LOGGER.debug("Starting game")
+        """
+        play until a single player is left, each player acting through Player.interact
+        :return: the winner
+        """
+        return drive(self.steps(), self)
+
+    def steps(self):
+        """
+        the game, as a generator yielding each player to act (the betting player of
+        current_round) and receiving the player's action. Callers that cannot wait on
+        Player.interact (e.g. a server waiting on remote players) run the game through it.
+        :return: the winner
+        """
+        TRACE.debug('game_started', players=len(self.players))
         while self.winner() is None:
             self.event_queue.put(Events.GAME_STARTED)
-            LOGGER.info("Playing round #%d" % (len(self.rounds) + 1))
-            LOGGER.info("Players are:")
-            for player in self.players:
-                LOGGER.info("%s" % player)
+            if TRACE.enabled(trace.INFO):
+                TRACE.info('round', number=self.round_count + 1, players=[str(player) for player in self.players])
             round_ = Round(self.players, self.button_player, self.small_blind, self.event_queue, self)
             self.current_round = round_
-            winnings = round_.play()
+            winnings = yield from round_.steps()
             self.rounds.append(round_)
-
-            for player, winning in winnings.items():
-                hand = player.best_hand(round_.community_cards)
-                self.log.append("round %d - %s won %d with %s [%s]" % (
-                    len(self.rounds) + 1, player.name, winning, hand.__class__.__name__, str(hand)))
+            self.round_count += 1
+
+            if self.game_log:
+                showdown = round_.showdown()
+                for player, winning in winnings.items():
+                    if player not in showdown.strengths:
+                        self.log.append("round %d - %s got %d back" % (self.round_count, player.name, winning))
+                        continue
+                    hand = showdown.hand(player)
+                    self.log.append("round %d - %s won %d with %s [%s]" % (
+                        self.round_count, player.name, winning, hand.__class__.__name__, str(hand)))
             # move button (before possibly removing button player)
             self.advance_button_player()
 
             # set up players
             for player in self.players:
                 if player.money == 0:
-                    LOGGER.info("Player %s finished the game" % str(player))
+                    TRACE.info('player_finished', player=player.name)
                     self.finished_players.append(player)
                     self.players.remove(player)
 
@@ -279,4 +497,3 @@ class Poker(object):
         for player in self.players:
             player.on_game_ended(self)
         return self.winner()
-
@@ -0,0 +1,132 @@
+"""
+Replay of recorded hands (see history).
+
+Every hand of a history file is settled again from its records alone: the pockets and
+board are scored with the current evaluator and the recorded contributions are paid out
+with the current Pot logic, without running any player code. Hands whose payouts differ
+from the recorded ones are reported. Batches of hands are replayed in parallel.
+
+Run python -m minipoker.logic.replay --help for the command line.
+"""
+import argparse
+import time
+
+from minipoker.logic import evaluator, history
+from minipoker.logic.poker import Pot
+
+HANDS_PER_BATCH = 10000
+
+
+class Mismatch(object):
+    def __init__(self, number, recorded, replayed):
+        """
+        :param recorded: seat -> amount paid out in the recording
+        :param replayed: seat -> amount paid out by the replay
+        """
+        self.number = number
+        self.recorded = recorded
+        self.replayed = replayed
+
+    def __str__(self):
+        return "hand %d: recorded %s, replayed %s" % (self.number, self.recorded, self.replayed)
+
+
+class ReplayReport(object):
+    def __init__(self):
+        self.hands = 0
+        self.mismatches = []
+        self.seconds = 0.0
+
+    @property
+    def hands_per_second(self):
+        return self.hands / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return "%d hands, %d mismatches in %.2fs (%.1f hands/s)" % (
+            self.hands, len(self.mismatches), self.seconds, self.hands_per_second)
+
+
+def _nonzero(payouts):
+    return {seat: amount for seat, amount in payouts.items() if amount}
+
+
+def settle(hand):
+    """
+    :param hand: history.HandRecord
+    :return: seat -> amount won, according to the current evaluator and pot logic
+    """
+    pot = Pot(hand.small_blind)
+    for seat, amount in hand.contributions().items():
+        pot.bet(seat, amount)
+    folded = hand.folded()
+    strengths = {seat: evaluator.evaluate(list(hand.pockets[seat]) + hand.board)
+                 for seat in range(len(hand.seats)) if seat not in folded}
+    seats = list(range(len(hand.seats)))
+    return dict(pot.payouts(strengths, seats[hand.button + 1:] + seats[:hand.button + 1]))
+
+
+def replay_hands(hands):
+    """
+    :return: (number of hands, list of Mismatch)
+    """
+    count = 0
+    mismatches = []
+    for hand in hands:
+        count += 1
+        replayed = _nonzero(settle(hand))
+        recorded = _nonzero(hand.payouts)
+        if replayed != recorded:
+            mismatches.append(Mismatch(hand.number, recorded, replayed))
+    return count, mismatches
+
+
+def _replay_batch(args):
+    path, start, end = args
+    reader = history.HistoryReader(path)
+    try:
+        return replay_hands(reader.hands(start, end))
+    finally:
+        reader.close()
+
+
+def replay_file(path, processes=None, hands_per_batch=HANDS_PER_BATCH):
+    """
+    :param processes: worker processes (defaults to all cpus, 1 replays in this process)
+    :return: ReplayReport
+    """
+    import multiprocessing
+    start = time.perf_counter()
+    reader = history.HistoryReader(path)
+    jobs = [(path, batch_start, batch_end) for batch_start, batch_end in reader.batches(hands_per_batch)]
+    reader.close()
+    report = ReplayReport()
+    if processes == 1:
+        results = map(_replay_batch, jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap(_replay_batch, jobs)
+    try:
+        for count, mismatches in results:
+            report.hands += count
+            report.mismatches.extend(mismatches)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="Replay recorded hands and report changed outcomes")
+    parser.add_argument('path')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--batch', type=int, default=HANDS_PER_BATCH, help="hands per batch")
+    arguments = parser.parse_args()
+    # run through the imported module, so the pool workers can find _replay_batch
+    from minipoker.logic import replay
+    result = replay.replay_file(arguments.path, arguments.processes, arguments.batch)
+    for mismatch in result.mismatches:
+        print(mismatch)
+    print(result)
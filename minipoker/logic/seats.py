@@ -0,0 +1,112 @@
+"""
+Seat state of a round.
+
+Seats are numbered in the order players sit, and the per seat flags are kept as bitsets
+(bit n for seat n):
+
+    folded      the player folded
+    all_in      the player has no money left to bet
+    acted       the player acted in the current betting street
+    owing       the player's bet is below the current bet
+
+With the seating ring, who is in the hand, who is left to act and whether a street is over
+are all a few integer operations, whatever the table size.
+"""
+
+
+def _lowest(bits):
+    """
+    :return: index of the lowest set bit (bits must not be 0)
+    """
+    return (bits & -bits).bit_length() - 1
+
+
+class SeatTable(object):
+    def __init__(self, players):
+        self.players = tuple(players)
+        self.seats = {player: seat for seat, player in enumerate(self.players)}
+        count = len(self.players)
+        # seat -> the next seat clockwise
+        self.ring = tuple((seat + 1) % count for seat in range(count))
+        self.everyone = (1 << count) - 1
+        self.folded = 0
+        self.all_in = 0
+        self.acted = 0
+        self.owing = 0
+        self.active_count = count
+
+    def fold(self, seat):
+        bit = 1 << seat
+        if not self.folded & bit:
+            self.folded |= bit
+            self.active_count -= 1
+            self.owing &= ~bit
+
+    def go_all_in(self, seat):
+        self.all_in |= 1 << seat
+
+    def act(self, seat):
+        self.acted |= 1 << seat
+
+    def new_street(self):
+        self.acted = 0
+
+    def raised(self, seat):
+        """
+        the seat's bet is the new current bet: everybody else who can still bet owes
+        """
+        self.owing = self.everyone & ~self.folded & ~(1 << seat)
+
+    def matched(self, seat):
+        """
+        the seat's bet is the current bet
+        """
+        self.owing &= ~(1 << seat)
+
+    def is_folded(self, seat):
+        return bool(self.folded >> seat & 1)
+
+    @property
+    def active(self):
+        return self.everyone & ~self.folded
+
+    def active_seats(self):
+        bits = self.active
+        while bits:
+            yield _lowest(bits)
+            bits &= bits - 1
+
+    def single_active(self):
+        """
+        :return: seat of the only player left in the hand, None while more are left
+        """
+        return _lowest(self.active) if self.active_count == 1 else None
+
+    @property
+    def pending(self):
+        """
+        :return: bits of the seats that still have to act in this street: players in the hand
+                 with money who owe, or who did not act yet while somebody else is left
+        """
+        pending = self.owing
+        if self.active_count > 1:
+            pending |= ~self.acted
+        return pending & self.everyone & ~self.folded & ~self.all_in
+
+    def is_pending(self, seat):
+        return bool(self.pending >> seat & 1)
+
+    def next_pending(self, seat, inclusive=False):
+        """
+        :param inclusive: whether seat itself may be the answer
+        :return: the first pending seat clockwise from seat, None when the street is over
+        """
+        pending = self.pending
+        if not inclusive:
+            pending &= ~(1 << seat)
+        if not pending:
+            return None
+        after = pending >> seat
+        if after:
+            return seat + _lowest(after)
+        return _lowest(pending)
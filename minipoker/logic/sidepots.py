@@ -0,0 +1,92 @@
+"""
+Side pots.
+
+At showdown the chips each player put in (the contribution vector) are cut into layers at
+the contribution levels of the players still in the hand: the main pot holds everybody's
+chips up to the smallest such level, each side pot the chips between two levels. A layer
+is won by the best hands among the players who reached its level, split evenly between
+them; the odd chips go one by one to the winners closest to the button's left. Chips above
+the highest level were never called and go back to whoever put them in.
+
+Everything is computed from sorted contributions, in O(n log n) for n players.
+"""
+from bisect import bisect_left
+from itertools import accumulate
+
+
+class SidePot(object):
+    __slots__ = ('amount', 'level', 'eligible')
+
+    def __init__(self, amount, level, eligible):
+        """
+        :param amount: chips in the pot
+        :param level: contribution level capping the pot
+        :param eligible: players still in the hand who reached the level
+        """
+        self.amount = amount
+        self.level = level
+        self.eligible = eligible
+
+    def __repr__(self):
+        return "SidePot(%d, level=%d, eligible=%r)" % (self.amount, self.level, self.eligible)
+
+
+def build_pots(contributions, live):
+    """
+    :param contributions: player -> chips put in
+    :param live: players still in the hand
+    :return: (list of SidePot, main pot first, player -> uncalled chips to return)
+    """
+    amounts = sorted(contributions.values())
+    totals = [0] + list(accumulate(amounts))
+
+    def capped(level):
+        # sum of min(contribution, level) over all contributions
+        below = bisect_left(amounts, level)
+        return totals[below] + level * (len(amounts) - below)
+
+    live = sorted(live, key=lambda player: contributions.get(player, 0))
+    pots = []
+    previous_level = previous_total = 0
+    for index, player in enumerate(live):
+        level = contributions.get(player, 0)
+        if level == previous_level:
+            continue
+        total = capped(level)
+        pots.append(SidePot(total - previous_total, level, live[index:]))
+        previous_level, previous_total = level, total
+    uncalled = {player: amount - previous_level for player, amount in contributions.items()
+                if amount > previous_level}
+    return pots, uncalled
+
+
+def settle(contributions, strengths, order=None):
+    """
+    :param contributions: player -> chips put in
+    :param strengths: player -> hand strength, for the players still in the hand
+    :param order: players in odd chip order (first left of the button first), defaults to
+                  the order of strengths
+    :return: player -> chips won (including returned uncalled chips), for every player paid
+    """
+    position = {player: index for index, player in enumerate(strengths if order is None else order)}
+    pots, uncalled = build_pots(contributions, strengths)
+    payouts = dict(uncalled)
+    # the eligible players of each pot are the ones of the previous pot minus those who did
+    # not reach its level, so the winners are found from the deepest pot out
+    winners = []
+    best = None
+    seen = 0
+    for pot in reversed(pots):
+        for player in pot.eligible[:len(pot.eligible) - seen]:
+            strength = strengths[player]
+            if best is None or strength > best:
+                best, winners = strength, [player]
+            elif strength == best:
+                winners.append(player)
+        seen = len(pot.eligible)
+        if len(winners) > 1:
+            winners.sort(key=position.__getitem__)
+        share, odd = divmod(pot.amount, len(winners))
+        for index, player in enumerate(winners):
+            payouts[player] = payouts.get(player, 0) + share + (1 if index < odd else 0)
+    return payouts
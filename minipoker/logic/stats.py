@@ -0,0 +1,201 @@
+"""
+Per-phase timing and counters of played rounds.
+
+Poker is given a stats object (NullStats by default, whose hooks do nothing) and every
+Round reports to it:
+
+    phases      wall time of dealing, blinds, each betting street and the showdown
+    decisions   decision latency (Player.interact), per player type, with percentiles
+    counters    e.g. hands evaluated at showdown, hand value lookups and equity calls
+
+RoundStats keeps these and can report a JSON or text snapshot every so many hands.
+"""
+import json
+import random
+import time
+
+# phases, in the order they are played
+DEALING = 'dealing'
+BLINDS = 'blinds'
+PREFLOP = 'betting:preflop'
+FLOP = 'betting:flop'
+TURN = 'betting:turn'
+RIVER = 'betting:river'
+SHOWDOWN = 'showdown'
+PHASES = (DEALING, BLINDS, PREFLOP, FLOP, TURN, RIVER, SHOWDOWN)
+
+# counters
+HANDS_EVALUATED = 'hands_evaluated'
+HAND_VALUES = 'hand_values'
+EQUITY_CALLS = 'equity_calls'
+TIMEOUTS = 'action_timeouts'
+
+# latency percentiles reported
+PERCENTILES = (50, 90, 99)
+
+
+class NullStats(object):
+    """
+    stats of games nobody measures: every hook does nothing (and no clock is read)
+    """
+
+    def clock(self):
+        return 0.0
+
+    def phase(self, name, start):
+        """
+        :param start: clock() at the start of the phase
+        :return: clock() at the end of the phase (the start of the next one)
+        """
+        return 0.0
+
+    def decision(self, player, start):
+        pass
+
+    def count(self, name, amount=1):
+        pass
+
+    def end_hand(self):
+        pass
+
+
+NULL_STATS = NullStats()
+
+
+class Timing(object):
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def as_dict(self):
+        return {'count': self.count, 'total': self.total, 'mean': self.mean, 'max': self.max}
+
+
+class Latency(Timing):
+    """
+    Timing that also keeps a uniform sample of the durations (reservoir sampling, at most
+    size of them) for the percentiles
+    """
+    __slots__ = ('size', 'samples', 'rng')
+
+    def __init__(self, size=4096, rng=None):
+        super(Latency, self).__init__()
+        self.size = size
+        self.samples = []
+        # sampling has its own generator, measuring must not change seeded games
+        self.rng = rng or random.Random(0)
+
+    def add(self, seconds):
+        super(Latency, self).add(seconds)
+        if len(self.samples) < self.size:
+            self.samples.append(seconds)
+        else:
+            index = self.rng.randrange(self.count)
+            if index < self.size:
+                self.samples[index] = seconds
+
+    def percentile(self, percent):
+        """
+        :return: the duration below which percent of the (sampled) durations are (nearest rank)
+        """
+        return _nearest_rank(sorted(self.samples), percent)
+
+    def as_dict(self):
+        timing = super(Latency, self).as_dict()
+        ordered = sorted(self.samples)
+        for percent in PERCENTILES:
+            timing['p%d' % percent] = _nearest_rank(ordered, percent)
+        return timing
+
+
+def _nearest_rank(ordered, percent):
+    if not ordered:
+        return 0.0
+    rank = -(-percent * len(ordered) // 100)
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+class RoundStats(NullStats):
+    def __init__(self, report_every=0, report=None):
+        """
+        :param report_every: report a snapshot every this many hands (0 never does)
+        :param report: function called with the stats for the periodic snapshots,
+                       e.g. lambda stats: print(stats) or lambda stats: output.write(stats.to_json() + "\\n")
+        """
+        self.report_every = report_every
+        self.report = report
+        self.started = time.perf_counter()
+        self.hands = 0
+        self.phases = {}
+        self.decisions = {}
+        self.counters = {}
+
+    clock = staticmethod(time.perf_counter)
+
+    def phase(self, name, start):
+        end = time.perf_counter()
+        timing = self.phases.get(name)
+        if timing is None:
+            timing = self.phases[name] = Timing()
+        timing.add(end - start)
+        return end
+
+    def decision(self, player, start):
+        kind = player.__class__.__name__
+        timing = self.decisions.get(kind)
+        if timing is None:
+            timing = self.decisions[kind] = Latency()
+        timing.add(time.perf_counter() - start)
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def end_hand(self):
+        self.hands += 1
+        if self.report_every and self.report is not None and self.hands % self.report_every == 0:
+            self.report(self)
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'hands': self.hands,
+            'seconds': elapsed,
+            'hands_per_second': self.hands / elapsed if elapsed else 0.0,
+            'phases': {name: timing.as_dict() for name, timing in self.phases.items()},
+            'decisions': {kind: timing.as_dict() for kind, timing in self.decisions.items()},
+            'counters': dict(self.counters),
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), sort_keys=True)
+
+    def __str__(self):
+        snapshot = self.snapshot()
+        lines = ["%d hands in %.2fs (%.1f hands/s)" % (
+            snapshot['hands'], snapshot['seconds'], snapshot['hands_per_second'])]
+        order = {name: index for index, name in enumerate(PHASES)}
+        phases = sorted(snapshot['phases'].items(), key=lambda item: order.get(item[0], len(order)))
+        for title, timings in (('phase', phases),
+                               ('decision', sorted(snapshot['decisions'].items()))):
+            for name, timing in timings:
+                line = "%-8s %-18s %8d x %9.1fus (max %9.1fus, total %.3fs)" % (
+                    title, name, timing['count'], timing['mean'] * 1e6, timing['max'] * 1e6, timing['total'])
+                percentiles = ["p%d %.1fus" % (percent, timing['p%d' % percent] * 1e6)
+                               for percent in PERCENTILES if 'p%d' % percent in timing]
+                lines.append(line + (" " + ", ".join(percentiles) if percentiles else ""))
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append("counter  %-18s %8d" % (name, value))
+        return "\n".join(lines)
@@ -1,8 +1,30 @@
 from minipoker.logic.hands import *
 from minipoker.logic.poker import *
 from minipoker.logic.players import *
+from minipoker.logic.deck import Deck, Suits, CARDS
+from minipoker.logic import evaluator, headless, history, replay, seats, sidepots, stats, tournament, trace
+from minipoker.logic.ai import cache, equity, isomorphism, preflop, strategies, utils, workers
+from minipoker import server
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+from math import comb
+import asyncio
+import io
+import json
+import os
+import pickle
+import random
+import tempfile
+import time
 import unittest
 
+try:
+    import numpy
+    from minipoker.logic import batch
+    from minipoker.logic.ai import cfr
+except ImportError:
+    numpy = None
+
 
 class TestPokerGame(unittest.TestCase):
     def setUp(self):
@@ -13,6 +35,421 @@ class TestPokerGame(unittest.TestCase):
         assert self.game.current_round.active_players == self.game.players
 
 
+class TestHeadlessGame(unittest.TestCase):
+    def test_bounded_history(self):
+        random.seed(4)
+        game = headless.make_game([RandomPlayer("Player" + str(i), 50) for i in range(4)], history=3)
+        winner = game.play()
+        assert winner is game.players[0]
+        assert isinstance(game.event_queue, NullEventQueue)
+        assert game.round_count > 3 and len(game.rounds) == 3
+        assert list(game.log) == ["STARTING GAME...", "%s won" % winner.name]
+
+    def test_throughput(self):
+        random.seed(5)
+        wins, throughput = headless.simulate(lambda: [RandomPlayer("Player" + str(i), 50) for i in range(3)], 5)
+        assert sum(wins.values()) == throughput.games == 5
+        assert throughput.hands > 0 and throughput.hands_per_second > 0
+
+
+class TestRoundStats(unittest.TestCase):
+    def test_phases_and_counters(self):
+        snapshots = []
+        round_stats = stats.RoundStats(report_every=5, report=lambda stats_: snapshots.append(stats_.snapshot()))
+        players = [RandomPlayer("Player" + str(i), 50, random.Random(i)) for i in range(3)]
+        game = Poker(players, headless=True, rng=random.Random(3), stats=round_stats)
+        game.play()
+        snapshot = round_stats.snapshot()
+        assert snapshot['hands'] == game.round_count
+        assert len(snapshots) == game.round_count // 5
+        for phase in (stats.BLINDS, stats.PREFLOP, stats.SHOWDOWN):
+            assert snapshot['phases'][phase]['count'] == game.round_count
+        assert snapshot['phases'][stats.DEALING]['count'] == 4 * game.round_count
+        assert snapshot['decisions']['RandomPlayer']['count'] > 0
+        assert snapshot['counters'][stats.HANDS_EVALUATED] >= game.round_count
+        assert json.loads(round_stats.to_json())['hands'] == game.round_count
+        assert "showdown" in str(round_stats)
+
+    def test_latency_percentiles(self):
+        latency = stats.Latency(size=50, rng=random.Random(1))
+        for millis in range(1, 101):
+            latency.add(millis / 1000.0)
+        assert latency.count == 100 and len(latency.samples) == 50 and latency.max == 0.1
+        timing = stats.Latency()
+        for millis in range(1, 101):
+            timing.add(millis / 1000.0)
+        assert (timing.percentile(50), timing.percentile(90), timing.percentile(99)) == (0.05, 0.09, 0.099)
+        assert timing.as_dict()['p90'] == 0.09 and stats.Latency().percentile(50) == 0.0
+
+
+class TestActionTimeout(unittest.TestCase):
+    class AwayPlayer(RandomPlayer):
+        """
+        gives every decision up, after looking at the time left
+        """
+
+        def __init__(self, *args):
+            super(TestActionTimeout.AwayPlayer, self).__init__(*args)
+            self.times_left = []
+
+        def interact(self, _game):
+            self.times_left.append(self.time_left(_game.current_round))
+            return None
+
+    class SlowPlayer(RandomPlayer):
+        def interact(self, _game):
+            time.sleep(0.003)
+            return Bet(self, _game.current_round) if Bet.is_valid(self, _game.current_round) else None
+
+    def test_late_players_check_or_fold(self):
+        away = self.AwayPlayer("away", 30, random.Random(1))
+        slow = self.SlowPlayer("slow", 30, random.Random(2))
+        players = [away, slow] + [RandomPlayer("Player" + str(i), 30, random.Random(i)) for i in range(2)]
+        round_stats = stats.RoundStats()
+        game = Poker(players, headless=True, rng=random.Random(3), stats=round_stats, action_timeout=0.002)
+        game.play()
+        assert away.times_left and all(0 < left <= 0.002 for left in away.times_left)
+        actions = [action for round_ in game.rounds for action in round_.action_log
+                   if action.player in (away, slow)]
+        assert actions and all(isinstance(action, (Check, Fold)) for action in actions)
+        assert round_stats.counters[stats.TIMEOUTS] == len(actions)
+        assert game.current_round.time_left() is None
+
+    class StalePlayer(RandomPlayer):
+        """
+        answers every turn with its first action
+        """
+
+        def interact(self, _game):
+            if not hasattr(self, 'first'):
+                self.first = super(TestActionTimeout.StalePlayer, self).interact(_game)
+            return self.first
+
+    def test_stale_actions_check_or_fold(self):
+        stale = self.StalePlayer("stale", 30, random.Random(1))
+        players = [stale] + [RandomPlayer("Player" + str(i), 30, random.Random(i)) for i in range(2)]
+        round_stats = stats.RoundStats()
+        game = Poker(players, headless=True, rng=random.Random(5), stats=round_stats)
+        winner = game.play()
+        assert winner.money == 3 * 30
+        actions = [action for round_ in game.rounds for action in round_.action_log if action.player is stale]
+        assert all(action is stale.first or isinstance(action, (Check, Fold)) for action in actions)
+        assert round_stats.counters[stats.TIMEOUTS] > 0
+
+    def test_no_deadline(self):
+        game = Poker([RandomPlayer("Player" + str(i), 30, random.Random(i)) for i in range(2)], headless=True,
+                     rng=random.Random(1))
+        steps = game.steps()
+        player = next(steps)
+        assert game.current_round.time_left() is None and player.time_left(game.current_round) is None
+
+
+class TestTrace(unittest.TestCase):
+    def play(self, **tracing):
+        output = io.StringIO()
+        previous = trace.configure(trace.FileSink(output), **tracing)
+        try:
+            players = [RandomPlayer("Player" + str(i), 50, random.Random(i)) for i in range(3)]
+            Poker(players, headless=True, rng=random.Random(3)).play()
+        finally:
+            trace.restore(previous)
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_levels_and_sampling(self):
+        events = self.play(level=trace.INFO)
+        names = {event['event'] for event in events}
+        assert {'action', 'bet', 'payout', 'round'} <= names
+        assert 'dealing' not in names
+        actions = sum(event['event'] == 'action' for event in events)
+        sampled = self.play(level=trace.INFO, sample=0.25, rng=random.Random(1))
+        assert 0 < sum(event['event'] == 'action' for event in sampled) < actions
+        assert not self.play(level=trace.WARNING)
+
+    def test_discard(self):
+        previous = trace.configure(None)
+        try:
+            assert not trace.tracer('poker-main').enabled(trace.WARNING)
+        finally:
+            trace.restore(previous)
+        assert trace.tracer('poker-main').enabled(trace.WARNING)
+
+
+class TestTournament(unittest.TestCase):
+    seats = ['random', 'random', 'random']
+
+    def test_tables_replay(self):
+        first = tournament.play_table((7, 3, self.seats, 50))
+        second = tournament.play_table((7, 3, self.seats, 50))
+        assert (first.winner, first.money, first.busted, first.hands) == \
+            (second.winner, second.money, second.busted, second.hands)
+
+    def test_parallel_matches_serial(self):
+        serial = tournament.run_tournament(self.seats, 8, seed=11, money=50, processes=1)
+        parallel = tournament.run_tournament(self.seats, 8, seed=11, money=50, processes=2)
+        assert serial.as_dict()['players'] == parallel.as_dict()['players']
+        assert serial.winners == parallel.winners
+        assert sum(player.games for player in serial.players.values()) == 8 * len(self.seats)
+
+    def test_seeded_deck(self):
+        # the deck only shuffles as it deals, equal seeds must deal the same cards in the same order
+        assert Deck(random.Random(1)).draw(52) == Deck(random.Random(1)).draw(52)
+        assert Deck(random.Random(1)).draw(52) != Deck(random.Random(2)).draw(52)
+
+
+class TestGameServer(unittest.TestCase):
+    @staticmethod
+    def chooser(rng):
+        def choose(message):
+            action = rng.choice(message['actions'])
+            if action == 'Bet':
+                return {'action': 'Bet', 'amount': rng.randint(message['minimum'], message['maximum'])}
+            return {'action': action}
+        return choose
+
+    def test_tables_with_tcp_and_unix_clients(self):
+        async def play():
+            game_server = server.GameServer(seats=4, remote_seats=2, money=30, seed=1)
+            host, port = await game_server.listen_tcp()
+            with tempfile.TemporaryDirectory() as directory:
+                path = await game_server.listen_unix(os.path.join(directory, 'poker.sock'))
+                bot_tables = [game_server.add_table(remote_seats=0) for _ in range(20)]
+                clients = [await server.Client.connect_tcp(host, port), await server.Client.connect_unix(path)]
+                results = await asyncio.gather(*[client.play("Player" + str(i), self.chooser(random.Random(i)))
+                                                 for i, client in enumerate(clients)])
+                await game_server.wait_tables()
+                for client in clients:
+                    client.close()
+                await game_server.close()
+            return game_server, bot_tables, results
+
+        game_server, bot_tables, results = asyncio.run(play())
+        remote_table = game_server.tables[len(bot_tables)]
+        for messages in results:
+            assert messages[0] == {'type': 'joined', 'table': remote_table.number, 'seat': messages[0]['seat']}
+            assert messages[-1] == {'type': 'game_over', 'winner': remote_table.winner.name}
+            assert any(message['type'] == 'pocket' for message in messages)
+            assert not any(message['type'] == 'error' for message in messages)
+        for table in bot_tables:
+            assert table.winner is not None and table.winner.money == 4 * 30
+        assert remote_table.winner.money == 4 * 30
+        # without a seed, every server deals differently
+        assert server.GameServer().seed != server.GameServer().seed
+
+    def test_invalid_actions_and_disconnects(self):
+        async def play():
+            game_server = server.GameServer(seats=2, remote_seats=2, money=10, seed=2)
+            host, port = await game_server.listen_tcp()
+            quitter, player = [await server.Client.connect_tcp(host, port) for _ in range(2)]
+            quitter.send({'type': 'join', 'name': 'quitter'})
+            await quitter.receive()
+            errors = []
+
+            def choose(message):
+                if not errors and 'Bet' in message['actions']:
+                    errors.append(message)
+                    return {'action': 'Bet', 'amount': -1}
+                # calls down, two players who only check or fold would trade blinds forever
+                for action in ('Call', 'Check', 'Fold'):
+                    if action in message['actions']:
+                        return {'action': action}
+            # the quitter leaves as soon as the table starts, and then checks or folds
+            playing = asyncio.ensure_future(player.play('player', choose))
+            while not any(message['type'] == 'hand' for message in [await quitter.receive()]):
+                pass
+            quitter.close()
+            messages = await playing
+            player.close()
+            await game_server.close()
+            return messages
+
+        messages = asyncio.run(play())
+        assert any(message['type'] == 'error' and 'amount' in message['message'] for message in messages)
+        assert messages[-1]['type'] == 'game_over'
+
+    def test_action_timeout(self):
+        async def play():
+            game_server = server.GameServer(seats=2, remote_seats=1, money=10, seed=3, action_timeout=0.01)
+            host, port = await game_server.listen_tcp()
+            client = await server.Client.connect_tcp(host, port)
+            client.send({'type': 'join', 'name': 'mute'})
+            messages = []
+            while not messages or messages[-1]['type'] != 'game_over':
+                messages.append(await client.receive())
+            client.close()
+            await game_server.close()
+            return messages
+
+        messages = asyncio.run(play())
+        requests = [message for message in messages if message['type'] == 'act']
+        assert requests and all(0 < message['time_left'] <= 0.01 for message in requests)
+        assert sum(message['type'] == 'timeout' for message in messages) == len(requests)
+
+    def test_oversized_lines(self):
+        async def play():
+            game_server = server.GameServer(seats=2, remote_seats=1, seed=5)
+            host, port = await game_server.listen_tcp()
+            client = await server.Client.connect_tcp(host, port)
+            client.connection.writer.write(b"x" * (server.MAX_LINE + 1) + b"\n")
+            messages = [await client.receive(), await client.receive()]
+            client.close()
+            await game_server.close()
+            return messages
+
+        error, end = asyncio.run(play())
+        assert error['type'] == 'error' and str(server.MAX_LINE) in error['message']
+        assert end is None
+
+    def test_slow_clients_are_dropped(self):
+        class Transport(object):
+            def __init__(self):
+                self.buffered = 0
+                self.aborted = False
+
+            def get_write_buffer_size(self):
+                return self.buffered
+
+            def abort(self):
+                self.aborted = True
+
+        class Writer(object):
+            def __init__(self):
+                self.transport = Transport()
+
+            def write(self, data):
+                self.transport.buffered += len(data)
+
+            def get_extra_info(self, name):
+                return None
+
+        connection = server.Connection(None, Writer())
+        message = {'type': 'board', 'card': '9s'}
+        while not connection.closed:
+            connection.send(message)
+        assert connection.writer.transport.aborted
+        assert connection.writer.transport.buffered > server.MAX_WRITE_BUFFER
+        # nothing more is queued for a dropped client
+        buffered = connection.writer.transport.buffered
+        connection.send(message)
+        assert connection.writer.transport.buffered == buffered
+
+    def test_slow_bots_time_out(self):
+        class SlowPlayer(RandomPlayer):
+            def interact(self, _game):
+                time.sleep(0.05)
+                return super(SlowPlayer, self).interact(_game)
+
+        async def play():
+            with ThreadPoolExecutor(8) as executor:
+                table = server.Table(0, 2, 0, 10, 'random', random.Random(4), action_timeout=0.01,
+                                     executor=executor)
+                table.make_players = lambda: [SlowPlayer("slow", 10, table.rng), RandomPlayer("fast", 10, table.rng)]
+                return await table.run()
+
+        # the slow bot never gets to act, it checks or folds until the fast one has all the money
+        assert asyncio.run(play()).name == "fast"
+
+
+class TestHandHistory(unittest.TestCase):
+    def record_game(self, path, seed=8):
+        players = [RandomPlayer("Player" + str(i), 50, random.Random(seed + i)) for i in range(3)]
+        with history.HistoryWriter(path) as writer:
+            game = Poker(list(players), headless=True, history=1, game_log=False, rng=random.Random(seed),
+                         recorder=writer)
+            game.play()
+        return game, players
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'hands.mphh')
+            game, players = self.record_game(path)
+            reader = history.HistoryReader(path)
+            hands = list(reader.hands())
+            assert [hand.number for hand in hands] == list(range(1, game.round_count + 1))
+            assert reader.names == {player.id: player.name for player in players}
+            first = hands[0]
+            assert [stack for _, stack in first.seats] == [50, 50, 50]
+            assert len(first.blinds) == 2 and len(first.board) == 5 and len(first.pockets) == 3
+            assert len(set(first.board) | {card for pocket in first.pockets.values() for card in pocket}) == 11
+            assert all(hand.payouts for hand in hands)
+            reader.close()
+
+    def test_truncated(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'hands.mphh')
+            self.record_game(path)
+            with open(path, 'r+b') as history_file:
+                history_file.truncate(os.path.getsize(path) - 3)
+            reader = history.HistoryReader(path)
+            self.assertRaises(history.InvalidHistoryException, list, reader.hands())
+            reader.close()
+
+
+class TestReplay(unittest.TestCase):
+    def test_replay_matches_recording(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'hands.mphh')
+            with history.HistoryWriter(path) as writer:
+                for seed in range(5):
+                    players = [RandomPlayer("Player" + str(i), 50, random.Random(seed * 10 + i)) for i in range(4)]
+                    Poker(players, headless=True, history=1, game_log=False, rng=random.Random(seed),
+                          recorder=writer).play()
+            serial = replay.replay_file(path, processes=1, hands_per_batch=7)
+            parallel = replay.replay_file(path, processes=2, hands_per_batch=7)
+            assert serial.hands == parallel.hands > 0
+            assert serial.mismatches == parallel.mismatches == []
+
+    def test_reports_changed_outcome(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'hands.mphh')
+            TestHandHistory().record_game(path)
+            reader = history.HistoryReader(path)
+            hands = list(reader.hands())
+            reader.close()
+            hands[0].payouts = {seat: amount + 1 for seat, amount in hands[0].payouts.items()}
+            count, mismatches = replay.replay_hands(hands)
+            assert count == len(hands)
+            assert [mismatch.number for mismatch in mismatches] == [hands[0].number]
+
+
+class TestCards(unittest.TestCase):
+    def test_encoding(self):
+        card = Card(13, Suits.CLUBS)
+        assert (card.value, card.suit, card.rank, card.prime) == (13, Suits.CLUBS, 12, 41)
+        assert card == 1 << 28 | 1 << 15 | 12 << 8 | 41
+        assert Card.from_code(int(card)) is card
+        assert Card.from_index(card.index) is card
+
+    def test_interned(self):
+        assert Card(5, 'Hearts') is Card(5, 'h') is Card(5, Suits.HEARTS)
+        assert pickle.loads(pickle.dumps(Card(5, Suits.HEARTS))) is Card(5, Suits.HEARTS)
+        assert len(set(CARDS)) == 52
+
+    def test_hash_includes_suit(self):
+        assert Card(5, Suits.HEARTS) != Card(5, Suits.CLUBS)
+        assert len({Card(5, Suits.HEARTS), Card(5, Suits.CLUBS)}) == 2
+
+    def test_sorted_by_value(self):
+        assert [c.value for c in sorted(CARDS)] == sorted(c.value for c in CARDS)
+
+    def test_removed_cards_are_never_drawn(self):
+        deck = Deck(random.Random(2))
+        removed = list(CARDS[::3])
+        remaining = deck.removeall(removed)
+        assert set(remaining) == set(CARDS) - set(removed)
+        assert all(deck.is_dead(card) for card in removed)
+        drawn = deck.draw(52)
+        assert len(drawn) == len(remaining) and not set(drawn) & set(removed)
+        self.assertRaises(IndexError, deck.draw_single)
+
+    def test_reset(self):
+        deck = Deck(random.Random(3))
+        deck.draw(9)
+        deck.removeall([CARDS[0]])
+        deck.reset()
+        assert len(deck) == 52 and deck.dead == 0
+        assert sorted(deck.draw(52)) == sorted(CARDS)
+
+
 class TestHands(unittest.TestCase):
     def test_straight_flush(self):
         assert type(Hand.get_hand([Card(v, 'SUIT') for v in [1, 2, 3, 4, 5]])) is StraightFlush
@@ -57,3 +494,404 @@ class TestHands(unittest.TestCase):
         assert type(Hand.get_hand([Card(v, s) for v, s in [(1, 'h'), (10, 'd'), (2, 'c'), (2, 's'), (5, 'c')]])) is Pair
         assert type(
             Hand.get_hand([Card(v, s) for v, s in [(1, 'd'), (1, 'd'), (1, 'd'), (4, 'c'), (5, 'd')]])) is not Pair
+
+    def test_same_category_comparisons(self):
+        low = Hand.get_hand([Card(v, s) for v, s in [(2, 'h'), (3, 'd'), (4, 'c'), (5, 's'), (6, 'c')]])
+        high = Hand.get_hand([Card(v, s) for v, s in [(3, 'h'), (4, 'd'), (5, 'c'), (6, 's'), (7, 'c')]])
+        assert high > low and low < high and high.compare_same(low) is True
+        kicker = Hand.get_hand([Card(v, s) for v, s in [(1, 'h'), (1, 'd'), (2, 'c'), (2, 's'), (5, 'c')]])
+        better_kicker = Hand.get_hand([Card(v, s) for v, s in [(1, 's'), (1, 'c'), (2, 'h'), (2, 'd'), (6, 'c')]])
+        assert better_kicker.compare_same(kicker) is True
+        assert kicker.compare_same(better_kicker) is False
+
+    def test_ties(self):
+        hand = Hand.get_hand([Card(v, s) for v, s in [(1, 'h'), (1, 'd'), (2, 'c'), (2, 's'), (5, 'c')]])
+        same = Hand.get_hand([Card(v, s) for v, s in [(1, 's'), (1, 'c'), (2, 'h'), (2, 'd'), (5, 'h')]])
+        assert hand == same and not hand > same and not hand < same
+
+
+class TestEvaluator(unittest.TestCase):
+    def test_distinct_strengths(self):
+        # same number of classes as the standard game: there are no ace-low straights, but the
+        # lowest five distinct values become one more high card (and flush) class instead
+        strengths = set(evaluator.REPEATED.values())
+        strengths.update(s for s in evaluator.FLUSHES if s)
+        strengths.update(s for s in evaluator.UNIQUE5 if s)
+        assert len(strengths) == 7462
+
+    def test_category_boundaries(self):
+        quads = Hand.get_hand([Card(v, s) for v, s in [(2, 'h'), (2, 'd'), (2, 'c'), (2, 's'), (1, 'c')]])
+        full_house = Hand.get_hand([Card(v, s) for v, s in [(13, 'h'), (13, 'd'), (13, 'c'), (12, 's'), (12, 'c')]])
+        assert evaluator.category(quads.strength) == evaluator.FOUR_OF_A_KIND
+        assert quads > full_house
+
+    def test_best_hand_matches_subsets(self):
+        rng = random.Random(3)
+        for size in (5, 6, 7):
+            for _ in range(500):
+                cards = rng.sample(CARDS, size)
+                best = max(Hand.get_hand(list(five)) for five in combinations(cards, 5))
+                hand = Hand.best_hand(cards)
+                assert hand.strength == best.strength
+                assert type(hand) is type(best)
+                assert Hand.get_hand(hand.cards).strength == hand.strength
+                assert set(hand.cards) <= set(cards)
+
+    def test_incremental_hand_state(self):
+        rng = random.Random(4)
+        for _ in range(500):
+            cards = rng.sample(CARDS, 7)
+            state = evaluator.HandState(cards[:2])
+            assert state.strength is None
+            for size in (3, 4, 5, 6, 7):
+                state.add(cards[size - 1])
+                if size >= 5:
+                    assert state.strength == evaluator.evaluate(cards[:size])
+
+    def test_draws(self):
+        state = evaluator.HandState([Card(v, s) for v, s in [(5, 'h'), (6, 'h'), (7, 'c'), (8, 'h'), (13, 'h')]])
+        assert state.flush_draw
+        # 4 or 9 complete the straight
+        assert state.straight_outs == (1 << 3) | (1 << 8)
+        state.add(Card(9, 'd'))
+        assert state.category == evaluator.STRAIGHT and not state.straight_outs
+        state.add(Card(2, 'h'))
+        assert state.category == evaluator.FLUSH and not state.flush_draw
+
+    def test_round_hand_states(self):
+        players = [RandomPlayer("Player" + str(i), 50, random.Random(i)) for i in range(3)]
+        game = Poker(players, headless=True, rng=random.Random(2))
+        round_ = Round(players, players[0], 1, game.event_queue, game)
+        round_.open_flop_cards()
+        round_.open_turn_cards()
+        for player in players:
+            assert round_.hand_state(player).strength == evaluator.evaluate(player.pocket + round_.community_cards)
+
+
+class TestShowdown(unittest.TestCase):
+    def test_evaluated_once(self):
+        round_stats = stats.RoundStats()
+        players = [RandomPlayer("Player" + str(i), 50, random.Random(i)) for i in range(4)]
+        game = Poker(players, headless=True, rng=random.Random(6), stats=round_stats)
+        round_ = Round(players, players[0], 1, game.event_queue, game)
+        for _ in range(5):
+            round_.open_card()
+        showdown = round_.showdown()
+        assert round_.showdown() is showdown and round_.get_round_winners() is showdown.ranking
+        assert round_stats.counters[stats.HANDS_EVALUATED] == len(players)
+        for player in players:
+            assert showdown.hand(player) == player.best_hand(round_.community_cards)
+            assert showdown.hand(player) is showdown.hand(player)
+        assert [player for group in showdown.tie_groups for player in group] == showdown.ranking
+
+    def test_tie_groups(self):
+        board = [Card(v, s) for v, s in [(9, 'h'), (10, 'd'), (11, 'c'), (12, 's'), (2, 'h')]]
+        pockets = [[Card(13, 'c'), Card(3, 'd')], [Card(13, 'd'), Card(4, 'c')], [Card(5, 'c'), Card(5, 'd')]]
+        showdown = Showdown({i: evaluator.HandState(pocket + board) for i, pocket in enumerate(pockets)})
+        # the same straight ties the first two, a pair is worse
+        assert showdown.tie_groups == [[0, 1], [2]]
+        assert showdown.rank(1) == 0 and showdown.rank(2) == 1
+
+
+class TestSidePots(unittest.TestCase):
+    def test_layers(self):
+        # seats 0 and 1 all in short, seat 4 folded after putting 30 in
+        contributions = {0: 10, 1: 25, 2: 60, 3: 60, 4: 30}
+        pots, uncalled = sidepots.build_pots(contributions, [0, 1, 2, 3])
+        assert [(pot.amount, pot.level, pot.eligible) for pot in pots] == [
+            (50, 10, [0, 1, 2, 3]), (60, 25, [1, 2, 3]), (75, 60, [2, 3])]
+        assert not uncalled
+
+    def test_payouts(self):
+        contributions = {0: 10, 1: 25, 2: 60, 3: 60, 4: 30}
+        # the shortest stack has the best hand, 2 and 3 split what is left
+        payouts = sidepots.settle(contributions, {0: 9, 1: 5, 2: 7, 3: 7})
+        assert payouts == {0: 50, 2: 68, 3: 67}
+        # odd chip to the first of the winners in odd chip order
+        assert sidepots.settle(contributions, {0: 9, 1: 5, 2: 7, 3: 7}, order=[3, 4, 0, 1, 2])[3] == 68
+
+    def test_uncalled_chips_returned(self):
+        assert sidepots.settle({0: 10, 1: 50}, {0: 1, 1: 0}) == {0: 20, 1: 40}
+
+    def test_ten_seats_conserve_chips(self):
+        rng = random.Random(9)
+        for _ in range(2000):
+            contributions = {seat: rng.randint(1, 200) for seat in range(10)}
+            strengths = {seat: rng.randint(0, 5) for seat in range(10) if rng.random() < 0.7} or {0: 0}
+            payouts = sidepots.settle(contributions, strengths)
+            assert sum(payouts.values()) == sum(contributions.values())
+            for seat, amount in payouts.items():
+                # nobody wins more from a player than they put in themselves
+                limit = sum(min(contribution, contributions[seat]) for contribution in contributions.values())
+                assert amount <= limit
+
+    def test_games_conserve_chips(self):
+        for seed in range(20):
+            players = [RandomPlayer("Player" + str(i), 50, random.Random(seed * 10 + i)) for i in range(6)]
+            game = Poker(players, headless=True, rng=random.Random(seed))
+            winner = game.play()
+            assert winner.money == 300
+
+
+class TestSeatTable(unittest.TestCase):
+    def test_next_to_act(self):
+        table = seats.SeatTable(range(10))
+        table.new_street()
+        assert table.next_pending(3, inclusive=True) == 3
+        table.act(3)
+        table.fold(4)
+        table.go_all_in(5)
+        assert table.next_pending(3) == 6
+        for seat in (0, 1, 2, 6, 7, 8, 9):
+            table.act(seat)
+        assert table.next_pending(9) is None
+        # a raise reopens the street for everybody else who can still bet
+        table.raised(7)
+        assert table.next_pending(7) == 8 and table.next_pending(3) == 6
+        assert list(table.active_seats()) == [0, 1, 2, 3, 5, 6, 7, 8, 9]
+
+    def test_single_active(self):
+        table = seats.SeatTable("abc")
+        table.fold(0)
+        assert table.single_active() is None
+        table.fold(2)
+        assert table.single_active() == 1 and table.active_count == 1
+
+    def test_all_in_players_do_not_act(self):
+        players = [RandomPlayer("Player" + str(i), 50, random.Random(i)) for i in range(3)]
+        game = Poker(players, headless=True, rng=random.Random(1))
+        round_ = Round(players, players[0], 1, game.event_queue, game)
+        round_.take_blinds()
+        players[1].bet(players[1].money, round_)
+        assert not round_.is_betting(players[1])
+        assert round_.is_betting(players[2]) and round_.is_betting(players[0])
+        assert round_.after(players[2]) is players[0]
+
+
+class TestEquity(unittest.TestCase):
+    pocket = (Card(13, Suits.HEARTS), Card(12, Suits.CLUBS))
+    flop = (Card(10, Suits.SPADES), Card(11, Suits.SPADES), Card(13, Suits.SPADES))
+
+    def test_sample_rank_matches_exact(self):
+        exact = utils.naive_rank(self.pocket, self.flop)
+        estimate = equity.sample_rank(self.pocket, self.flop, target_error=0.02, max_samples=50000,
+                                      rng=random.Random(7))
+        assert abs(estimate.mean - exact) < 2 * estimate.error
+
+    def test_budgets(self):
+        assert equity.sample_rank(self.pocket, (), max_samples=100).samples == 100
+        assert equity.sample_rank(self.pocket, (), max_samples=100).stopped == equity.MAX_SAMPLES
+        estimate = equity.sample_rank(self.pocket, (), target_error=0.1, rng=random.Random(1))
+        assert estimate.error <= 0.1 and estimate.samples >= 30
+        assert equity.sample_rank(self.pocket, (), time_budget=0.01).samples > 0
+        self.assertRaises(equity.NoBudgetException, equity.sample_rank, self.pocket, ())
+
+    def test_equity(self):
+        aces = (Card(13, Suits.HEARTS), Card(13, Suits.CLUBS))
+        estimate = equity.sample_equity(aces, (), opponents=1, max_samples=2000, rng=random.Random(2))
+        assert 0.8 < estimate.mean < 0.9
+        # the board is a straight flush, so all four players split the pot
+        river = self.flop + (Card(9, Suits.SPADES), Card(12, Suits.SPADES))
+        assert equity.sample_equity(self.pocket, river, opponents=3, max_samples=50).mean == 0.25
+
+
+class TestIsomorphism(unittest.TestCase):
+    def test_canonical_key(self):
+        pocket, board = [Card(13, 'h'), Card(12, 'h')], [Card(2, 'h'), Card(5, 'c'), Card(9, 's')]
+        renamed_pocket, renamed_board = [Card(13, 'd'), Card(12, 'd')], [Card(2, 'd'), Card(5, 's'), Card(9, 'h')]
+        assert isomorphism.canonical_key(pocket, board) == isomorphism.canonical_key(renamed_pocket, renamed_board)
+        assert isomorphism.canonicalize(pocket, board) == isomorphism.canonicalize(renamed_pocket, renamed_board)
+        # the board card is not interchangeable with a pocket card
+        assert isomorphism.canonical_key(pocket[:1], pocket[1:]) != isomorphism.canonical_key(pocket, [])
+
+    def test_completion_weights(self):
+        for known in ([], [Card(13, 'h'), Card(13, 'c')], [Card(13, 'h'), Card(12, 'c'), Card(3, 'c')]):
+            for count in range(4):
+                drawn = list(isomorphism.completions(count, known))
+                assert sum(weight for _, weight in drawn) == comb(52 - len(known), count)
+                assert len({tuple(sorted(cards)) for cards, _ in drawn}) == len(drawn)
+
+    def test_naive_rank_is_exact(self):
+        pocket, flop = [Card(13, 'h'), Card(12, 'c')], [Card(2, 'h'), Card(5, 'h'), Card(9, 's')]
+        rest = [card for card in CARDS if card not in pocket + flop]
+        ranks = [evaluator.category(evaluator.evaluate(pocket + flop + list(turn_river)))
+                 for turn_river in combinations(rest, 2)]
+        assert abs(utils.naive_rank(pocket, flop) - sum(ranks) / len(ranks)) < 1e-9
+
+
+class TestPreflopTable(unittest.TestCase):
+    def test_hand_classes(self):
+        classes = {preflop.hand_class(*pocket) for pocket in combinations(CARDS, 2)}
+        assert classes == set(range(preflop.CLASSES))
+        for index in range(preflop.CLASSES):
+            assert preflop.hand_class(*preflop.representative(index)) == index
+
+    @unittest.skipIf(preflop.table() is None, "preflop table was not built")
+    def test_packaged_table(self):
+        table = preflop.table()
+        for pocket in [(Card(13, 'h'), Card(13, 'c')), (Card(1, 's'), Card(6, 'd')), (Card(12, 'd'), Card(11, 'd'))]:
+            assert abs(table.hand_value(pocket) - utils.naive_rank(pocket, ())) < 1e-6
+            assert table.equity(pocket, 1) > table.equity(pocket, preflop.MAX_OPPONENTS)
+        aces = table.equity((Card(13, 'h'), Card(13, 'c')), 1)
+        assert 0.82 < aces < 0.87
+
+    def test_truncated_table(self):
+        with tempfile.NamedTemporaryFile(delete=False) as table_file:
+            table_file.write(preflop.HEADER.pack(preflop.MAGIC, preflop.VERSION, preflop.CLASSES, preflop.COLUMNS, 1))
+            table_file.write(b'\0' * 16)
+        try:
+            self.assertRaises(preflop.InvalidTableException, preflop.PreflopTable, table_file.name)
+        finally:
+            os.remove(table_file.name)
+
+
+class TestHandValueCache(unittest.TestCase):
+    def test_hits_and_eviction(self):
+        for policy, survivor in ((cache.LRU, 'a'), (cache.FIFO, 'b')):
+            hand_values = cache.HandValueCache(maxsize=2, policy=policy)
+            hand_values.get('a', lambda: 1)
+            hand_values.get('b', lambda: 2)
+            assert hand_values.get('a', lambda: None) == 1
+            hand_values.get('c', lambda: 3)
+            assert survivor in hand_values.entries
+            assert (hand_values.stats.hits, hand_values.stats.misses, hand_values.stats.evictions) == (1, 3, 1)
+
+    def test_disk_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'hand-values.sqlite')
+            first = cache.HandValueCache(path=path)
+            first.get('key', lambda: [0.5, 0.01])
+            first.close()
+            second = cache.HandValueCache(path=path)
+            assert second.get('key', lambda: None) == [0.5, 0.01]
+            assert second.get('key', lambda: None) == [0.5, 0.01]
+            assert (second.stats.disk_hits, second.stats.hits, second.stats.misses) == (1, 1, 0)
+            second.close()
+
+    def test_rushed_estimates_are_not_kept(self):
+        hand_values = cache.HandValueCache()
+        strategy = strategies.SimpleSaneStrategy(1, 1, 1, 1, hand_values=hand_values, max_samples=200,
+                                                 time_budget=None)
+        pocket, board = (int(Card(13, 'h')), int(Card(12, 'h'))), (int(Card(2, 'c')), int(Card(7, 'd')),
+                                                                    int(Card(9, 's')))
+        strategy.hand_value(pocket, board, time_left=1e-6)
+        assert not hand_values.entries
+        # a deadline that does not bind gives the seeded, cached estimate
+        full = strategy.hand_value(pocket, board, time_left=30.0)
+        assert len(hand_values.entries) == 1
+        hand_values.clear()
+        assert strategy.hand_value(pocket, board) == full
+        # once there, the estimate of the full budget serves rushed callers too
+        assert strategy.hand_value(pocket, board, time_left=1e-6) == full
+
+    def test_situation_key(self):
+        key = cache.situation_key('naive_rank', [Card(13, 'h'), Card(12, 'h')], [Card(2, 'c')])
+        assert key == cache.situation_key('naive_rank', [Card(13, 's'), Card(12, 's')], [Card(2, 'd')])
+        assert key != cache.situation_key('naive_rank', [Card(13, 's'), Card(12, 's')], [Card(2, 's')])
+
+
+class TestWorkerPool(unittest.TestCase):
+    def test_lazy_parallel_rank(self):
+        pool = workers.WorkerPool(processes=2)
+        assert not pool.started
+        pocket, flop = (Card(13, 'h'), Card(12, 'c')), (Card(2, 'h'), Card(5, 'h'), Card(9, 's'))
+        try:
+            assert abs(workers.naive_rank(pocket, flop, pool) - utils.naive_rank(pocket, flop)) < 1e-9
+            assert pool.started
+        finally:
+            pool.shutdown()
+        assert not pool.started
+
+    def test_single_process_runs_inline(self):
+        pool = workers.WorkerPool(processes=1)
+        assert pool.map(abs, [-1, 2]) == [1, 2]
+        assert not pool.started
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestBatchEvaluation(unittest.TestCase):
+    def test_agrees_with_hand(self):
+        rng = random.Random(5)
+        for size in (5, 6, 7):
+            hands = [rng.sample(CARDS, size) for _ in range(2000)]
+            strengths = batch.evaluate_batch(batch.to_array(hands))
+            assert list(strengths) == [Hand.best_hand(hand).strength for hand in hands]
+
+    def test_all_flushes(self):
+        hands = [list(five) for five in combinations([c for c in CARDS if c.suit == Suits.CLUBS], 5)]
+        categories = batch.categories(batch.evaluate_batch(batch.to_array(hands)))
+        assert set(categories) == {evaluator.FLUSH, evaluator.STRAIGHT_FLUSH}
+
+    def test_invalid_shape(self):
+        self.assertRaises(ValueError, batch.evaluate_batch, numpy.zeros((3, 4), dtype=numpy.int64))
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestCFR(unittest.TestCase):
+    class TreePlayer(BasePlayer):
+        """
+        plays a random path of the abstract betting tree, as real actions
+        """
+        ACTIONS = {} if numpy is None else {cfr.FOLD: Fold, cfr.CHECK: Check, cfr.CALL: Call, cfr.BET_MIN: Bet,
+                                            cfr.BET_POT: Bet}
+
+        def __init__(self, name, tree, cursor, rng):
+            super(TestCFR.TreePlayer, self).__init__(name, tree.stack, rng)
+            self.tree = tree
+            self.cursor = cursor
+
+        def interact(self, _game):
+            round_ = _game.current_round
+            tree, node = self.tree, self.cursor[0]
+            assert tree.kind[node] == cfr.ACT and round_.players[tree.player[node]] is self
+            index = self.rng.randrange(len(tree.actions[node]))
+            self.cursor[0] = tree.children[node][index]
+            action = self.ACTIONS[tree.actions[node][index]]
+            assert action.is_valid(self, round_)
+            if action is Bet:
+                return Bet(self, round_, tree.amounts[node][index])
+            return action(self, round_)
+
+    def test_tree_follows_round_rules(self):
+        tree = cfr.GameTree(12, 1, 2)
+        rng = random.Random(4)
+        for _ in range(300):
+            cursor = [tree.root]
+            players = [self.TreePlayer("Player" + str(i), tree, cursor, rng) for i in range(2)]
+            game = Poker(list(players), headless=True, rng=rng)
+            # the first player sits after the button
+            game.current_round = Round(players, players[1], tree.small_blind, game.event_queue, game)
+            game.current_round.play()
+            node = cursor[0]
+            assert tree.kind[node] in (cfr.FOLDED, cfr.SHOWDOWN)
+            assert tuple(game.current_round.pot.bets[player] for player in players) == tree.contributions[node]
+
+    def test_parallel_and_checkpoint(self):
+        serial = cfr.Solver(stack=6, raise_cap=1).train(40, processes=1, batch=10, jobs=2, seed=1)
+        parallel = cfr.Solver(stack=6, raise_cap=1).train(40, processes=2, batch=10, jobs=2, seed=1)
+        assert numpy.array_equal(serial.regrets, parallel.regrets)
+        assert numpy.array_equal(serial.strategy_sum, parallel.strategy_sum)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cfr.npz')
+            cfr.Solver(stack=6, raise_cap=1).train(20, batch=10, jobs=2, seed=1, checkpoint=path)
+            resumed = cfr.Solver.load(path).train(20, batch=10, jobs=2, seed=1)
+            assert resumed.iterations == 40
+            assert numpy.array_equal(resumed.regrets, serial.regrets)
+            assert numpy.array_equal(resumed.strategy_sum, serial.strategy_sum)
+            numpy.savez(path, regrets=serial.regrets)
+            self.assertRaises(cfr.InvalidCheckpointException, cfr.Solver.load, path)
+
+    def test_average_strategy(self):
+        solver = cfr.Solver(stack=6, raise_cap=1).train(300, seed=2)
+        assert (solver.regrets >= 0).all()
+        strategy = solver.average_strategy()
+        tree = solver.tree
+        for node in range(len(tree)):
+            if tree.kind[node] == cfr.ACT:
+                rows = strategy[tree.offsets[node]:tree.offsets[node] + cfr.BUCKETS[tree.street[node]]]
+                assert numpy.allclose(rows.sum(axis=1), 1)
+                illegal = [action for action in range(cfr.ACTIONS) if action not in tree.actions[node]]
+                assert not rows[:, illegal].any()
+        aces = preflop.hand_class(Card(13, Suits.SPADES), Card(13, Suits.HEARTS))
+        distribution = solver.distribution(tree.root, aces)
+        assert isinstance(distribution, cfr.CFRDistribution) and distribution.check == 0
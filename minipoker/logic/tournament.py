@@ -0,0 +1,149 @@
+"""
+Multi-process tournament runner.
+
+Plays many independent headless games ("tables") across a process pool. Every table gets
+its own random generator, derived from the tournament seed and the table number, which
+drives the seating, the shuffles and the players' decisions, so any table can be replayed
+exactly on its own with play_table. Per player results are aggregated into one Report.
+
+Run python -m minipoker.logic.tournament --help for the command line.
+"""
+import argparse
+import json
+import random
+import time
+
+from minipoker.logic import headless
+from minipoker.logic.ai import workers
+
+
+def table_rng(seed, table):
+    """
+    :return: the random generator of a table
+    """
+    return random.Random("%s-%d" % (seed, table))
+
+
+def seat_name(player_type, seat):
+    return "%s-%d" % (player_type, seat)
+
+
+def play_table(args):
+    """
+    :param args: (seed, table number, player types by seat, starting money)
+    :return: TableResult
+    """
+    seed, table, seats, money = args
+    rng = table_rng(seed, table)
+    types = headless.player_types()
+    players = [types[player_type](seat_name(player_type, seat), money, rng) for seat, player_type in enumerate(seats)]
+    # the game drops players from its list as they run out of money
+    game = headless.make_game(list(players), rng=rng)
+    start = time.perf_counter()
+    winner = game.play()
+    return TableResult(table, winner.name, {player.name: player.money for player in players},
+                       [player.name for player in game.finished_players], game.round_count,
+                       time.perf_counter() - start)
+
+
+class TableResult(object):
+    def __init__(self, table, winner, money, busted, hands, seconds):
+        """
+        :param winner: name of the winner
+        :param money: final money by player name
+        :param busted: names of players in the order they ran out of money
+        """
+        self.table = table
+        self.winner = winner
+        self.money = money
+        self.busted = busted
+        self.hands = hands
+        self.seconds = seconds
+
+
+class PlayerReport(object):
+    def __init__(self, name):
+        self.name = name
+        self.games = 0
+        self.wins = 0
+        self.money = 0
+        self.busted_first = 0
+
+    @property
+    def win_rate(self):
+        return self.wins / self.games if self.games else 0.0
+
+    def as_dict(self):
+        return {
+            'games': self.games,
+            'wins': self.wins,
+            'win_rate': self.win_rate,
+            'average_money': self.money / self.games if self.games else 0.0,
+            'busted_first': self.busted_first,
+        }
+
+
+class Report(object):
+    def __init__(self, seed):
+        self.seed = seed
+        self.players = {}
+        self.throughput = headless.Throughput()
+        self.winners = []
+
+    def add(self, result):
+        for name, money in result.money.items():
+            player = self.players.setdefault(name, PlayerReport(name))
+            player.games += 1
+            player.money += money
+            player.wins += name == result.winner
+            player.busted_first += bool(result.busted) and result.busted[0] == name
+        self.winners.append(result.winner)
+        self.throughput.add(headless.Throughput(1, result.hands, result.seconds))
+
+    def as_dict(self):
+        return {
+            'seed': self.seed,
+            'players': {name: player.as_dict() for name, player in sorted(self.players.items())},
+            'throughput': self.throughput.as_dict(),
+        }
+
+
+def _init_worker():
+    # pool workers are daemons and can not start their own pool
+    workers.configure(1)
+
+
+def run_tournament(seats, tables, seed=0, money=100, processes=None):
+    """
+    :param seats: player type (see headless.player_types) of every seat
+    :param tables: number of tables to play
+    :param seed: tournament seed, the same seed replays the same tournament
+    :param processes: worker processes (defaults to all cpus, 1 plays in this process)
+    :return: Report
+    """
+    import multiprocessing
+    processes = processes or multiprocessing.cpu_count()
+    jobs = [(seed, table, list(seats), money) for table in range(tables)]
+    if processes == 1:
+        results = [play_table(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(processes, initializer=_init_worker) as pool:
+            results = pool.map(play_table, jobs, chunksize=max(1, tables // (4 * processes)))
+    report = Report(seed)
+    for result in sorted(results, key=lambda result: result.table):
+        report.add(result)
+    return report
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="Play many headless games across processes")
+    parser.add_argument('seats', nargs='+', help="player types: %s" % ', '.join(sorted(headless.player_types())))
+    parser.add_argument('--tables', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--money', type=int, default=100)
+    parser.add_argument('--processes', type=int, default=None)
+    arguments = parser.parse_args()
+    # run through the imported module, so the pool workers can find play_table
+    from minipoker.logic import tournament
+    print(json.dumps(tournament.run_tournament(arguments.seats, arguments.tables, arguments.seed, arguments.money,
+                                               arguments.processes).as_dict(), indent=2, sort_keys=True))
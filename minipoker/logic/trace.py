@@ -0,0 +1,154 @@
+"""
+Structured tracing of the game logic.
+
+Modules get a tracer for their component and emit events with fields instead of formatted
+messages:
+
+    TRACE = trace.tracer('poker-main')
+    TRACE.info('dealing', players=len(players))
+    TRACE.sampled('action', player=player.name, action=action.name)
+
+Nothing is formatted unless a sink writes the event (guard fields that are costly to
+compute with TRACE.enabled(level)). Per action events (sampled) are only kept for a
+fraction of the calls, see configure. Sinks:
+
+    LoggingSink     forwards to the standard logging module (the default, warnings only)
+    FileSink        writes JSON lines (or text lines) to a file or stream
+    None            discards every event
+"""
+import json
+import logging
+import random
+import time
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+# level of a tracing without a sink, above every event
+OFF = logging.CRITICAL + 1
+
+
+class Event(object):
+    __slots__ = ('time', 'component', 'name', 'level', 'fields')
+
+    def __init__(self, component, name, level, fields):
+        self.time = time.time()
+        self.component = component
+        self.name = name
+        self.level = level
+        self.fields = fields
+
+    def as_dict(self):
+        return dict(self.fields, time=self.time, component=self.component, event=self.name,
+                    level=logging.getLevelName(self.level))
+
+    def __str__(self):
+        return " ".join([self.name] + ["%s=%s" % item for item in self.fields.items()])
+
+
+class LoggingSink(object):
+    """
+    forwards events to the logger of their component (formatted only if the logger emits them)
+    """
+
+    def write(self, event):
+        logging.getLogger(event.component).log(event.level, "%s", event)
+
+    def close(self):
+        pass
+
+
+class FileSink(object):
+    def __init__(self, output, as_json=True):
+        """
+        :param output: path or writable text stream
+        :param as_json: write JSON lines (otherwise "component event key=value ..." lines)
+        """
+        self.owned = isinstance(output, str)
+        self.output = open(output, 'a') if self.owned else output
+        self.as_json = as_json
+
+    def write(self, event):
+        if self.as_json:
+            self.output.write(json.dumps(event.as_dict(), default=str) + "\n")
+        else:
+            self.output.write("%s %s\n" % (event.component, event))
+
+    def close(self):
+        if self.owned:
+            self.output.close()
+        else:
+            self.output.flush()
+
+
+class Tracing(object):
+    def __init__(self, sink, level=WARNING, sample=1.0, rng=None):
+        self.sink = sink
+        self.level = level if sink is not None else OFF
+        self.sample = sample
+        # sampling has its own generator, tracing must not change seeded games
+        self.rng = rng or random.Random()
+
+
+_tracing = Tracing(LoggingSink())
+
+
+def configure(sink=LoggingSink(), level=WARNING, sample=1.0, rng=None):
+    """
+    :param sink: where events go (LoggingSink, FileSink, a path for JSON lines, or None to discard them)
+    :param level: minimum level of the events written
+    :param sample: fraction of the sampled (per action) events written, at INFO level
+    :param rng: random generator choosing the sampled events
+    :return: the previous tracing (restore it with restore)
+    """
+    global _tracing
+    if isinstance(sink, str):
+        sink = FileSink(sink)
+    previous, _tracing = _tracing, Tracing(sink, level, sample, rng)
+    return previous
+
+
+def restore(tracing):
+    global _tracing
+    if _tracing.sink is not None and _tracing.sink is not tracing.sink:
+        _tracing.sink.close()
+    _tracing = tracing
+
+
+class Tracer(object):
+    __slots__ = ('component',)
+
+    def __init__(self, component):
+        self.component = component
+
+    def enabled(self, level):
+        return level >= _tracing.level
+
+    def debug(self, name, **fields):
+        if DEBUG >= _tracing.level:
+            _tracing.sink.write(Event(self.component, name, DEBUG, fields))
+
+    def info(self, name, **fields):
+        if INFO >= _tracing.level:
+            _tracing.sink.write(Event(self.component, name, INFO, fields))
+
+    def warning(self, name, **fields):
+        if WARNING >= _tracing.level:
+            _tracing.sink.write(Event(self.component, name, WARNING, fields))
+
+    def sampled(self, name, **fields):
+        """
+        per action event: written at INFO level, for the configured fraction of the calls
+        """
+        tracing = _tracing
+        if INFO >= tracing.level and (tracing.sample >= 1 or tracing.rng.random() < tracing.sample):
+            tracing.sink.write(Event(self.component, name, INFO, fields))
+
+
+_tracers = {}
+
+
+def tracer(component):
+    if component not in _tracers:
+        _tracers[component] = Tracer(component)
+    return _tracers[component]
@@ -0,0 +1,514 @@
+"""
+Multi-table game server.
+
+A single asyncio event loop hosts many Poker tables. Every table runs its game through
+Poker.steps: bots decide on a small shared thread pool, remote players are asked over their
+connection, and the table waits for either without holding up the other tables (no thread
+per table or per seat).
+
+Players connect over TCP or a Unix socket and exchange JSON objects, one per line. Cards
+are written as value and suit letter (e.g. "13h", see Card.__repr__).
+
+client -> server
+    {"type": "join", "name": "..."}                     take a seat at the next table
+    {"type": "action", "action": "Bet", "amount": 10}   answer an "act" message (Fold, Check,
+                                                        Call or Bet, only Bet takes an amount)
+
+server -> client
+    {"type": "joined", "table": 3, "seat": 1}
+    {"type": "hand", "number": 1, "button": 0, "players": [{"name": ..., "money": ...}, ...]}
+    {"type": "pocket", "cards": ["13h", "2c"]}          only to the player holding them
+    {"type": "blind", "seat": 1, "amount": 1}
+    {"type": "board", "card": "9s"}
+    {"type": "action", "seat": 2, "action": "Call", "amount": 2}
+    {"type": "act", "actions": ["Fold", "Call", "Bet"], "to_call": 2, "minimum": 4, "maximum": 98,
+     "pot": 3, "money": 98, "community": [...],
+     "time_left": 29.5}                                 the player's turn (time_left is null
+                                                        when actions have no deadline)
+    {"type": "timeout"}                                 the player did not answer in time
+    {"type": "payout", "seat": 2, "amount": 6}
+    {"type": "end_hand"}
+    {"type": "game_over", "winner": "..."}
+    {"type": "error", "message": "..."}
+
+A table starts once its remote seats are taken, the other seats are filled with bots.
+Players who disconnect, or who do not act within the action timeout (bots included), check
+when they can and fold otherwise. Client is a minimal
+client, for tests and bot clients. Run python -m minipoker.server --help for the command
+line.
+"""
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import random
+
+from minipoker.logic import headless, trace
+from minipoker.logic.history import NullRecorder
+from minipoker.logic.players import BasePlayer, Bet, Call, Check, Fold, passive_action
+from minipoker.logic.poker import Poker
+from minipoker.logic.tournament import table_rng
+
+TRACE = trace.tracer('poker-server')
+
+ACTIONS = {action.name: action for action in (Fold, Check, Call, Bet)}
+
+# longest message line read, in bytes
+MAX_LINE = 1 << 16
+# bytes queued for a client that does not read before the server drops it
+MAX_WRITE_BUFFER = 1 << 20
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Connection(object):
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    def send(self, message):
+        if self.closed:
+            return
+        self.writer.write(json.dumps(message).encode('utf-8') + b"\n")
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            # tables do not wait for slow readers, the messages would pile up in memory
+            TRACE.warning('slow_client', peer=self.writer.get_extra_info('peername'))
+            self.abort()
+
+    async def receive(self):
+        """
+        :return: the next message, None once the connection is closed (a line over the reader's
+                 limit closes it, the rest of the line could not be told from the next messages)
+        """
+        try:
+            line = await self.reader.readline()
+        except ValueError:
+            self.send({'type': 'error', 'message': "messages are limited to %d bytes" % MAX_LINE})
+            self.close()
+            return None
+        if not line:
+            return None
+        try:
+            message = json.loads(line)
+        except ValueError:
+            raise ProtocolError("invalid JSON: %r" % line[:100])
+        if not isinstance(message, dict):
+            raise ProtocolError("messages are JSON objects")
+        return message
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+
+    def abort(self):
+        """
+        close without flushing what is left to send
+        """
+        self.closed = True
+        self.writer.transport.abort()
+
+
+class RemotePlayer(BasePlayer):
+
+    NAME = "Remote"
+
+    def __init__(self, name, starting_money, connection, rng=None):
+        super(RemotePlayer, self).__init__(name, starting_money, rng)
+        self.connection = connection
+        # the answer to the pending "act" message
+        self.answer = None
+
+    def interact(self, _game):
+        raise NotImplementedError("remote players act through decide")
+
+    def get_amount(self, _min, _max):
+        # amounts are checked before the Bet is made
+        return _min
+
+    def deliver(self, message):
+        """
+        :param message: an action message from the client, None once it disconnected
+        """
+        if self.answer is not None and not self.answer.done():
+            self.answer.set_result(message)
+        elif message is not None:
+            self.connection.send({'type': 'error', 'message': "not your turn"})
+
+    def parse(self, message, round_):
+        """
+        :return: the action the message asks for
+        """
+        actions = self.available_actions(round_)
+        action = ACTIONS.get(message.get('action'))
+        if action not in actions:
+            raise ProtocolError("action has to be one of %s" % ", ".join(available.name for available in actions))
+        if action is not Bet:
+            return action(self, round_)
+        minimum, maximum = round_.pot.minimum_to_bet(self), self.money
+        amount = message.get('amount')
+        if not isinstance(amount, int) or not minimum <= amount <= maximum:
+            raise ProtocolError("amount has to be between %d and %d" % (minimum, maximum))
+        return Bet(self, round_, amount)
+
+    async def decide(self, game):
+        """
+        ask the client for an action, and wait for a valid one
+        :return: the action, None if the time to act ran out
+        """
+        round_ = game.current_round
+        while not self.connection.closed:
+            self.connection.send(self.request(round_))
+            self.answer = asyncio.get_running_loop().create_future()
+            try:
+                message = await asyncio.wait_for(self.answer, self.time_left(round_))
+            except asyncio.TimeoutError:
+                self.connection.send({'type': 'timeout'})
+                return None
+            finally:
+                self.answer = None
+            if message is None:
+                break
+            try:
+                return self.parse(message, round_)
+            except ProtocolError as error:
+                self.connection.send({'type': 'error', 'message': str(error)})
+        return passive_action(self, round_)
+
+    def request(self, round_):
+        pot = round_.pot
+        return {
+            'type': 'act',
+            'actions': [action.name for action in self.available_actions(round_)],
+            'to_call': pot.amount_to_call(self),
+            'minimum': pot.minimum_to_bet(self),
+            'maximum': self.money,
+            'pot': sum(pot.bets.values()),
+            'money': self.money,
+            'community': [repr(card) for card in round_.community_cards],
+            'time_left': self.time_left(round_),
+        }
+
+
+class TableRecorder(NullRecorder):
+    """
+    recorder that sends the game's events to the remote players of a table
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.round = None
+
+    def start_hand(self, number, round_):
+        self.round = round_
+        self.table.broadcast({
+            'type': 'hand', 'number': number, 'button': round_.seat(round_.button_player),
+            'players': [{'name': player.name, 'money': player.money} for player in round_.players],
+        })
+
+    def pocket(self, seat, cards):
+        player = self.round.players[seat]
+        if isinstance(player, RemotePlayer):
+            player.connection.send({'type': 'pocket', 'cards': [repr(card) for card in cards]})
+
+    def blind(self, seat, amount):
+        self.table.broadcast({'type': 'blind', 'seat': seat, 'amount': amount})
+
+    def action(self, seat, action):
+        self.table.broadcast({'type': 'action', 'seat': seat, 'action': action.name,
+                              'amount': getattr(action, 'amount', 0)})
+
+    def board(self, card):
+        self.table.broadcast({'type': 'board', 'card': repr(card)})
+
+    def payout(self, seat, amount):
+        self.table.broadcast({'type': 'payout', 'seat': seat, 'amount': amount})
+
+    def end_hand(self):
+        self.table.broadcast({'type': 'end_hand'})
+
+
+class Table(object):
+    def __init__(self, number, seats, remote_seats, money, bot, rng, action_timeout=None, executor=None):
+        """
+        :param seats: number of players
+        :param remote_seats: seats taken by remote players, bots take the others
+        :param bot: player type of the bots (see headless.player_types)
+        :param action_timeout: seconds per action (see Poker)
+        :param executor: runs the bots' decisions (None for the event loop's default executor)
+        """
+        self.number = number
+        self.seats = seats
+        self.remote_seats = remote_seats
+        self.money = money
+        self.bot = bot
+        self.rng = rng
+        self.action_timeout = action_timeout
+        self.executor = executor
+        self.remote_players = []
+        self.game = None
+        self.winner = None
+
+    @property
+    def full(self):
+        return len(self.remote_players) >= self.remote_seats
+
+    def sit(self, name, connection):
+        player = RemotePlayer(name, self.money, connection, self.rng)
+        self.remote_players.append(player)
+        return player
+
+    def broadcast(self, message):
+        for player in self.remote_players:
+            player.connection.send(message)
+
+    def make_players(self):
+        bot = headless.player_types()[self.bot]
+        bots = [bot("%s-%d" % (self.bot, seat), self.money, self.rng)
+                for seat in range(len(self.remote_players), self.seats)]
+        return self.remote_players + bots
+
+    async def bot_decision(self, player):
+        """
+        :return: the bot's Action, or None when it did not decide in its time left
+        """
+        decision = asyncio.get_running_loop().run_in_executor(self.executor, player.interact, self.game)
+        try:
+            return await asyncio.wait_for(decision, player.time_left(self.game.current_round))
+        except asyncio.TimeoutError:
+            TRACE.warning('bot_timeout', table=self.number, player=player.name)
+            return None
+
+    async def run(self):
+        """
+        play the table's game to the end
+        :return: the winner
+        """
+        players = self.make_players()
+        self.game = Poker(players, headless=True, history=headless.HISTORY, game_log=False, rng=self.rng,
+                          recorder=TableRecorder(self), action_timeout=self.action_timeout)
+        steps = self.game.steps()
+        try:
+            player = next(steps)
+            while True:
+                if isinstance(player, RemotePlayer):
+                    action = await player.decide(self.game)
+                else:
+                    action = await self.bot_decision(player)
+                player = steps.send(action)
+        except StopIteration as done:
+            self.winner = done.value
+        TRACE.info('table_finished', table=self.number, winner=self.winner.name, hands=self.game.round_count)
+        self.broadcast({'type': 'game_over', 'winner': self.winner.name})
+        return self.winner
+
+
+class GameServer(object):
+    def __init__(self, seats=6, remote_seats=1, money=100, bot='random', seed=None, action_timeout=None,
+                 bot_threads=4):
+        """
+        :param seats: players per table
+        :param remote_seats: seats per table for remote players, the others are bots
+        :param bot: player type of the bots (see headless.player_types)
+        :param seed: seed of the tables' random generators (see tournament.table_rng). Without one a
+                     fresh seed is drawn, remote players must not be able to replay the deals
+        :param action_timeout: seconds a player has per action (None waits forever)
+        :param bot_threads: threads deciding for the bots of all the tables
+        """
+        self.seats = seats
+        self.remote_seats = remote_seats
+        self.money = money
+        self.bot = bot
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+            # logged, so the server's games can still be reproduced
+            TRACE.warning('server_seed', seed=seed)
+        self.seed = seed
+        self.action_timeout = action_timeout
+        self.bots = ThreadPoolExecutor(bot_threads, thread_name_prefix='poker-bot')
+        self.tables = {}
+        self.filling = None
+        self.tasks = set()
+        self.servers = []
+        # connection -> task handling it
+        self.connections = {}
+
+    def add_table(self, remote_seats=None):
+        """
+        :param remote_seats: seats for remote players (defaults to the server's), a table without
+                             any starts right away
+        :return: Table
+        """
+        number = len(self.tables)
+        remote_seats = self.remote_seats if remote_seats is None else remote_seats
+        table = Table(number, self.seats, remote_seats, self.money, self.bot, table_rng(self.seed, number),
+                      self.action_timeout, self.bots)
+        self.tables[number] = table
+        if table.full:
+            self.start(table)
+        return table
+
+    def start(self, table):
+        task = asyncio.get_running_loop().create_task(table.run())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def join(self, name, connection):
+        """
+        :return: (Table, RemotePlayer) seated at the first table with a free remote seat
+        """
+        if self.filling is None:
+            self.filling = self.add_table()
+        table = self.filling
+        player = table.sit(name, connection)
+        if table.full:
+            self.filling = None
+            self.start(table)
+        return table, player
+
+    async def handle(self, reader, writer):
+        connection = Connection(reader, writer)
+        self.connections[connection] = asyncio.current_task()
+        player = None
+        try:
+            while True:
+                try:
+                    message = await connection.receive()
+                except ProtocolError as error:
+                    connection.send({'type': 'error', 'message': str(error)})
+                    continue
+                if message is None:
+                    break
+                if message.get('type') == 'join' and player is None:
+                    table, player = self.join(str(message.get('name', 'remote'))[:32], connection)
+                    connection.send({'type': 'joined', 'table': table.number,
+                                     'seat': table.remote_players.index(player)})
+                elif message.get('type') == 'action' and player is not None:
+                    player.deliver(message)
+                else:
+                    connection.send({'type': 'error', 'message': "unexpected %r message" % message.get('type')})
+        except ConnectionError:
+            pass
+        finally:
+            del self.connections[connection]
+            connection.close()
+            if player is not None:
+                player.deliver(None)
+
+    async def listen_tcp(self, host='127.0.0.1', port=0):
+        """
+        :return: the (host, port) listened on
+        """
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        self.servers.append(server)
+        return server.sockets[0].getsockname()[:2]
+
+    async def listen_unix(self, path):
+        self.servers.append(await asyncio.start_unix_server(self.handle, path, limit=MAX_LINE))
+        return path
+
+    async def wait_tables(self):
+        """
+        wait for the started tables to finish
+        """
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks))
+
+    async def close(self):
+        for server in self.servers:
+            server.close()
+        for connection in list(self.connections):
+            # the handler sees the end of the stream and finishes
+            connection.abort()
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, *self.connections.values(), return_exceptions=True)
+        for server in self.servers:
+            await server.wait_closed()
+        # bots still deciding past their time are not waited for
+        self.bots.shutdown(wait=False, cancel_futures=True)
+
+
+def passive_choice(message):
+    """
+    check when possible, fold otherwise
+    """
+    return {'action': 'Check' if 'Check' in message['actions'] else 'Fold'}
+
+
+class Client(object):
+    def __init__(self, reader, writer):
+        self.connection = Connection(reader, writer)
+
+    @classmethod
+    async def connect_tcp(cls, host, port):
+        return cls(*await asyncio.open_connection(host, port, limit=MAX_LINE))
+
+    @classmethod
+    async def connect_unix(cls, path):
+        return cls(*await asyncio.open_unix_connection(path, limit=MAX_LINE))
+
+    def send(self, message):
+        self.connection.send(message)
+
+    async def receive(self):
+        return await self.connection.receive()
+
+    async def play(self, name, choose=passive_choice):
+        """
+        join a table and play it to the end
+        :param choose: function of an "act" message returning the action message to send
+        :return: list of the messages received
+        """
+        self.send({'type': 'join', 'name': name})
+        messages = []
+        while True:
+            message = await self.receive()
+            if message is None:
+                return messages
+            messages.append(message)
+            if message['type'] == 'act':
+                self.send(dict(choose(message), type='action'))
+            elif message['type'] == 'game_over':
+                return messages
+
+    def close(self):
+        self.connection.close()
+
+
+async def serve(arguments):
+    server = GameServer(arguments.seats, arguments.remote_seats, arguments.money, arguments.bot, arguments.seed,
+                        arguments.action_timeout, arguments.bot_threads)
+    if arguments.unix:
+        await server.listen_unix(arguments.unix)
+        print("listening on %s" % arguments.unix)
+    else:
+        print("listening on %s:%d" % await server.listen_tcp(arguments.host, arguments.port))
+    print("seed %s" % server.seed)
+    for _ in range(arguments.bot_tables):
+        server.add_table(remote_seats=0)
+    await asyncio.Event().wait()
+
+
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="Host poker tables for remote players")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7000)
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--seats', type=int, default=6, help="players per table")
+    parser.add_argument('--remote-seats', type=int, default=1, help="seats per table for remote players")
+    parser.add_argument('--money', type=int, default=100)
+    parser.add_argument('--bot', default='random', choices=sorted(headless.player_types()))
+    parser.add_argument('--bot-tables', type=int, default=0, help="tables of bots only to host as well")
+    parser.add_argument('--seed', default=None, help="deal the same cards on every run (a random seed by default)")
+    parser.add_argument('--action-timeout', type=float, default=30.0, metavar='SECONDS',
+                        help="seconds per action, late players check or fold")
+    parser.add_argument('--bot-threads', type=int, default=4, help="threads deciding for the bots")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -25,5 +25,12 @@ setup(
     # You can just specify the packages manually here if your project is
     #  simple. Or you can use find_packages().
     packages=find_packages(exclude=['contrib', 'docs', 'tests*']),
-    install_requires=['']
+    package_data={
+        'minipoker.logic.ai': ['data/*.bin'],
+    },
+    install_requires=[''],
+    extras_require={
+        'batch': ['numpy'],
+        'cfr': ['numpy'],
+    }
 )
\ No newline at end of file